@@ -0,0 +1,209 @@
+import numpy as np
+import networkx as nx
+import msgspec
+from scipy import sparse
+from concurrent.futures import ThreadPoolExecutor
+
+
+METRICS = {
+    "pagerank": "PageRank",
+    "betweenness": "Betweenness (approx.)",
+    "core": "k-core",
+    "community": "Community",
+}
+
+# Metrics that should be colored on a gradient rather than as categories
+CONTINUOUS_METRICS = ["pagerank", "betweenness"]
+
+
+# The only part that reads the graph itself, so it has to run where the graph is edited
+def edge_index(G:nx.MultiDiGraph) -> tuple[list, np.ndarray]:
+    nodes = list(G)
+    index = { n: i for i, n in enumerate(nodes) }
+    pairs = np.array([ (index[u], index[v]) for u, v in G.edges() ], dtype=np.int64).reshape(-1, 2)
+    return nodes, pairs
+
+
+# Integer-indexed sparse copy of the graph's structure, for vectorized analytics
+class CSRSnapshot(msgspec.Struct):
+    nodes : list
+    directed : sparse.csr_matrix
+    undirected : sparse.csr_matrix
+
+    @classmethod
+    def from_graph(cls, G:nx.MultiDiGraph):
+        return cls.from_pairs(*edge_index(G))
+
+    @classmethod
+    def from_pairs(cls, nodes:list, pairs:np.ndarray):
+        n = len(nodes)
+        # parallel links add up to a weight in the directed matrix
+        directed = sparse.csr_matrix((np.ones(len(pairs)), (pairs[:, 0], pairs[:, 1])), shape=(n, n))
+        # self loops count toward pagerank, as in networkx, but a node isn't its own neighbor
+        links = pairs[pairs[:, 0] != pairs[:, 1]]
+        undirected = sparse.csr_matrix((np.ones(2 * len(links)), (np.r_[links[:, 0], links[:, 1]], np.r_[links[:, 1], links[:, 0]])), shape=(n, n))
+        undirected.data[:] = 1
+        return cls(nodes=nodes, directed=directed, undirected=undirected)
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def to_dict(self, values) -> dict:
+        return dict(zip(self.nodes, values.tolist()))
+
+
+def pagerank(S:CSRSnapshot, alpha:float = 0.85, tol:float = 1.0e-6, max_iter:int = 100):
+    n = len(S)
+    if n == 0:
+        return np.zeros(0)
+    out_weight = np.asarray(S.directed.sum(axis=1)).ravel()
+    dangling = out_weight == 0
+    inverse = np.divide(1.0, out_weight, out=np.zeros(n), where=~dangling)
+    transitions = (sparse.diags(inverse) @ S.directed).T.tocsr()
+
+    x = np.full(n, 1.0 / n)
+    for _ in range(max_iter):
+        x_next = alpha * (transitions @ x + x[dangling].sum() / n) + (1 - alpha) / n
+        if np.abs(x_next - x).sum() < n * tol:
+            return x_next
+        x = x_next
+    return x
+
+
+# Brandes' dependency accumulation from one source, one BFS level at a time
+def source_dependencies(A:sparse.csr_matrix, source:int):
+    n = A.shape[0]
+    dist = np.full(n, -1)
+    sigma = np.zeros(n)
+    dist[source] = 0
+    sigma[source] = 1
+    levels = [ np.array([source]) ]
+
+    while True:
+        frontier = levels[-1]
+        reach = A[frontier].T @ sigma[frontier]
+        new = np.flatnonzero((reach > 0) & (dist < 0))
+        if len(new) == 0:
+            break
+        dist[new] = len(levels)
+        sigma[new] = reach[new]
+        levels.append(new)
+
+    delta = np.zeros(n)
+    for depth in range(len(levels) - 1, 0, -1):
+        level, previous = levels[depth], levels[depth - 1]
+        coefficient = np.zeros(n)
+        coefficient[level] = (1 + delta[level]) / sigma[level]
+        delta[previous] += sigma[previous] * (A[previous] @ coefficient)
+    delta[source] = 0
+    return delta
+
+
+def betweenness(S:CSRSnapshot, samples:int = 100, seed:int = 0):
+    n = len(S)
+    if n <= 2:
+        return np.zeros(n)
+    rng = np.random.default_rng(seed)
+    sources = rng.choice(n, size=min(samples, n), replace=False)
+    total = np.zeros(n)
+    for s in sources:
+        total += source_dependencies(S.undirected, s)
+    return total * (n / len(sources)) / ((n - 1) * (n - 2))
+
+
+def core_number(S:CSRSnapshot):
+    A = S.undirected
+    n = len(S)
+    degree = np.diff(A.indptr)
+    core = np.zeros(n, dtype=np.int64)
+    alive = np.ones(n, dtype=bool)
+    k = 0
+    while alive.any():
+        k = max(k, degree[alive].min())
+        peel = np.flatnonzero(alive & (degree <= k))
+        while len(peel) > 0:
+            core[peel] = k
+            alive[peel] = False
+            degree = degree - np.bincount(A[peel].indices, minlength=n)
+            peel = np.flatnonzero(alive & (degree <= k))
+    return core
+
+
+# Semi-synchronous label propagation: half the nodes adopt their most common neighbor label each round
+def label_propagation(S:CSRSnapshot, max_iter:int = 30, seed:int = 0):
+    A = S.undirected
+    n = len(S)
+    rng = np.random.default_rng(seed)
+    labels = np.arange(n)
+    if A.nnz == 0:
+        return labels
+    rows = np.repeat(np.arange(n), np.diff(A.indptr))
+
+    for _ in range(max_iter):
+        keys, counts = np.unique(rows * n + labels[A.indices], return_counts=True)
+        key_rows, key_labels = keys // n, keys % n
+        order = np.lexsort((rng.random(len(keys)), -counts, key_rows))
+        first = order[np.r_[True, key_rows[order][1:] != key_rows[order][:-1]]]
+
+        best = labels.copy()
+        best[key_rows[first]] = key_labels[first]
+        update = rng.random(n) < 0.5
+        changed = update & (best != labels)
+        if not changed.any() and (best == labels).all():
+            break
+        labels = np.where(update, best, labels)
+
+    # renumber communities from largest to smallest
+    values, inverse, counts = np.unique(labels, return_inverse=True, return_counts=True)
+    rank = np.empty(len(values), dtype=np.int64)
+    rank[np.argsort(-counts, kind="stable")] = np.arange(len(values))
+    return rank[inverse]
+
+
+def compute_metric(S:CSRSnapshot, metric:str) -> dict:
+    if metric == "pagerank":
+        values = pagerank(S)
+    elif metric == "betweenness":
+        values = betweenness(S)
+    elif metric == "core":
+        values = core_number(S)
+    elif metric == "community":
+        values = label_propagation(S)
+    else:
+        raise ValueError(f"Unknown metric: {metric}")
+    return S.to_dict(values)
+
+
+# Runs analytics off the session's thread and remembers results until the graph changes.
+# The graph is read on the caller's thread, since edits change it in place there;
+# the worker thread only sees the integer arrays taken from it.
+class Analytics:
+
+    def __init__(self, workers:int = 1):
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.version = None
+        self.edges = None
+        self.snapshot = None
+        self.snapshot_version = None
+        self.results = {}
+
+    def cached(self, version, metric:str) -> dict|None:
+        if version != self.version:
+            return None
+        return self.results.get(metric)
+
+    def compute(self, version, edges:tuple, metric:str) -> dict:
+        if self.snapshot_version != version:
+            self.snapshot = CSRSnapshot.from_pairs(*edges)
+            self.snapshot_version = version
+        values = compute_metric(self.snapshot, metric)
+        if version == self.version:
+            self.results[metric] = values
+        return values
+
+    def submit(self, G:nx.MultiDiGraph, version, metric:str):
+        if version != self.version:
+            self.version = version
+            self.edges = edge_index(G)
+            self.results = {}
+        return self.pool.submit(self.compute, version, self.edges, metric)
@@ -7,10 +7,28 @@ import asyncio
 import msgspec
 from collections import OrderedDict
 from shiny import App, Inputs, Outputs, Session, reactive, render, ui, req
+from shiny.session import session_context
 from shinywidgets import output_widget, render_widget
 from shiny.types import FileInfo
 from htmltools import TagList, div
-from qng import GraphSchema, NodeFactory, LinkFactory, GraphFactory, SigmaFactory, Element, QNG
+from qng import GraphSchema, NodeFactory, LinkFactory, GraphFactory, SigmaFactory, Element, QNG, AliasIndex, ContentHashes
+from store import GraphStore, StoreNeighborhood
+from neighborhood import Neighborhood
+from history import History
+from analytics import Analytics, METRICS, CONTINUOUS_METRICS
+from temporal import TemporalIndex
+from memory import governor, estimate_frame, estimate_build
+from snapshot import shared_snapshot, attach, cleanup_snapshots
+from diff import hash_graph, diff_graphs
+from paths import PathSearch
+from compute import pool
+from parallel import parallel_graph, run_shared, PARALLEL_ROWS
+from preview import project_graph, sample_frame
+from grid import FrameIndex
+from visibility import VisibilityIndex, NODE_CATEGORIES, LINK_CATEGORIES
+from sessions import SessionStore, SessionState, workspace_id, new_workspace_id, WORKSPACE_SCRIPT
+from tables import import_tables, export_tables, FORMATS as TABLE_FORMATS
+from datetime import date
 
 
 
@@ -46,6 +64,7 @@ help_text = {
     "name": "the name of a person or company. Use '%' as a wildcard", 
     "street": "the street address - exclude city/state/zip",
     "file_number": "corporate/llc file number, prefixed by CORP or LLC",
+    "build_on_disk": "For files too big to graph in memory. The graph is written to disk and only the part you select, search for, or connect is loaded for display.",
     "save/load_qng_graph_file": "Save a copy of this graph data in the Quick Network Graph (QNG) format, upload a graph you saved earlier, or upload one from Quick Network Graph at bit.ly/qng. Uploads are added to the current graph"
 }
 
@@ -71,7 +90,7 @@ def get_modal(title:str|None = None, prompt:str|ui.TagList|None = None, buttons:
 # control_button_style = "width: 50%; margin:2px 2px 2px 2px;"
 
 app_ui = ui.page_fillable(
-    ui.head_content(ui.include_css("font-awesome-4.7.0 2/css/font-awesome.min.css")),
+    ui.head_content(ui.include_css("font-awesome-4.7.0 2/css/font-awesome.min.css"), ui.tags.script(WORKSPACE_SCRIPT)),
     
     ui.tags.style( """
         .accordion {margin 0px 0px 0px 0px;}
@@ -97,8 +116,8 @@ app_ui = ui.page_fillable(
                 ui.a("A Public Data Tools project", href="http://publicdatatools.com"),
             ),
             ui.div(
-                ui.help_text("Upload a spreadsheet, a QNG graph file, or a QNGS schema file"),
-                ui.input_file("file1", "",accept=[".csv", ".xlsx", ".json", ".qng", ".qngs"], multiple=False, placeholder='XLSX, CSV, QNG', width="100%"),        
+                ui.help_text("Upload a spreadsheet, a QNG graph file, a QNGS schema file, or a zip of node and link tables"),
+                ui.input_file("file1", "",accept=[".csv", ".xlsx", ".parquet", ".arrow", ".json", ".qng", ".qngs", ".zip"], multiple=False, placeholder='XLSX, CSV, QNG', width="100%"),        
             ),
             col_widths=(7,5),
         ),
@@ -154,10 +173,17 @@ app_ui = ui.page_fillable(
                     ui.output_data_frame("added_link_factories"),
                     "Nodes",
                     ui.output_data_frame("added_node_factories"), 
+                    ui.input_checkbox("on_disk", tooltip("Build on disk"), value=False),
+                    ui.input_checkbox("release_frame", "Free the spreadsheet after building", value=False),
+                    ui.layout_columns(
+                        ui.input_numeric("preview_rows", "Preview rows", value=2000, min=100, step=500),
+                        ui.input_select("preview_stratify", "Sample", choices={"": "Random rows"}),
+                    ),
                     ui.card_footer(
                         ui.layout_columns(
                             ui.download_button("save_graph_schema", "Save Schema"),
                             ui.input_action_button("reset_schema", "Reset"),
+                            ui.input_action_button("preview_graph", "Preview"),
                             ui.input_action_button("build_graph", "Build Graph")
                         ),
                     ),
@@ -165,7 +191,19 @@ app_ui = ui.page_fillable(
                 ),
                 col_widths = (7,5),
             ),
-            ui.output_data_frame("user_data")    
+            ui.output_ui("build_preview"),
+            ui.layout_columns(
+                ui.input_select("grid_sort", "Sort by", choices={"": "File order"}),
+                ui.input_checkbox("grid_descending", "Descending", value=False),
+                ui.input_select("grid_filter_col", "Filter", choices={"": "No filter"}),
+                ui.input_text("grid_filter", "Containing", placeholder=""),
+                ui.input_numeric("grid_page", "Page", value=1, min=1),
+                ui.input_select("grid_page_size", "Rows per page", choices=["100", "500", "1000"], selected="500"),
+                col_widths=(2, 1, 2, 3, 2, 2),
+            ),
+            ui.output_text("grid_status"),
+            ui.output_data_frame("user_data"),
+            ui.output_ui("column_summaries"),
         ),
         ui.accordion_panel("Graph", 
             ui.layout_columns(
@@ -175,6 +213,7 @@ app_ui = ui.page_fillable(
                             ui.div(
                                 ui.input_selectize("selected_nodes", "", choices=[], multiple=True),                        
                                 ui.input_checkbox("and_neighbors", "and connected nodes", value=False),
+                                ui.input_numeric("neighbor_hops", "up to this many links away", value=1, min=1),
                                 ui.input_checkbox("tidy", "merge likely duplicates", value=False),
                             ),
                             col_widths = (12),
@@ -184,6 +223,10 @@ app_ui = ui.page_fillable(
                                 ui.input_action_button("combine", "Merge"),
                                 ui.input_action_button("remove", "Remove"),
                             ),
+                            ui.row(
+                                ui.input_action_button("undo", "Undo"),
+                                ui.input_action_button("redo", "Redo"),
+                            ),
                         ),
                     ),
                     ui.card(
@@ -191,7 +234,9 @@ app_ui = ui.page_fillable(
                         ui.layout_columns(
                                 ui.input_select("path_start", "Start", choices = []),
                                 ui.input_select("path_end", "End", choices = []),
-                            col_widths=(6,6)
+                                ui.input_numeric("path_cutoff", "Up to this many links (0 = shortest only)", value=0, min=0),
+                                ui.input_numeric("max_paths", "Most paths", value=100, min=1),
+                            col_widths=(6,6,6,6)
                         ),
                         ui.card_footer(
                             ui.row(
@@ -203,8 +248,14 @@ app_ui = ui.page_fillable(
                     ui.card(
                         
                         ui.input_select("node_color_attribute", "Node color", choices = []),
+                        ui.input_select("node_size_attribute", "Node size", choices = []),
                         ui.input_select("edge_size_attribute", "Edge size", choices = []),
-                        ui.input_checkbox("show_all_labels", "Show all labels", value=False)
+                        ui.input_checkbox("show_all_labels", "Show all labels", value=False),
+                        ui.layout_columns(
+                            ui.input_select("metric", "Analytics", choices = METRICS),
+                            ui.input_action_button("compute_metric", "Compute"),
+                            col_widths=(8, 4)
+                        ),
                     ),
                     ui.card(
                         ui.card_header(tooltip("Subgraph")),
@@ -216,13 +267,38 @@ app_ui = ui.page_fillable(
                         width=(1/2),
                         fill=False,
                         ),
+                        ui.input_numeric("subgraph_hops", "Links away (0 = everything connected)", value=0, min=0),
+                        ui.input_numeric("hub_limit", "Hub threshold (links)", value=1000, min=1),
+                        ui.input_checkbox("exclude_hubs", "Don't search through hubs", value=False),
                     ),
                     ui.card(
                         ui.download_button("export_graph", "Export HTML"),
-                        ui.download_button("save_graph_data", "Save Graph")
+                        ui.input_checkbox("export_gzip", "Compress export (gzip)", value=False),
+                        ui.download_button("save_tables", "Export tables"),
+                        ui.input_select("table_format", "", choices=TABLE_FORMATS),
+                        ui.download_button("save_graph_data", "Save Graph"),
+                        ui.input_file("compare_file", "Compare with a saved graph", accept=[".qng"], multiple=False),
+                        ui.input_checkbox("highlight_diff", "Highlight changes", value=True),
+                    ),
+                    ui.card(
+                        ui.card_header("Timeline"),
+                        ui.layout_columns(
+                            ui.input_select("timeline_start", "Links start", choices = []),
+                            ui.input_select("timeline_end", "Links end", choices = []),
+                            ui.input_slider("timeline", "Show links active", min=date(2000, 1, 1), max=date.today(), value=(date(2000, 1, 1), date.today()), animate=True, time_format="%Y-%m-%d"),
+                            ui.input_action_button("clear_timeline", "Show all"),
+                            col_widths=(2, 2, 6, 2)
+                        ),
+                    ),
+                    ui.card(
+                        ui.card_header("Hide"),
+                        ui.layout_columns(
+                            *[ ui.input_selectize(f"hide_nodes_{attr}", title, choices=[], multiple=True) for attr, title in NODE_CATEGORIES.items() ],
+                            *[ ui.input_selectize(f"hide_links_{attr}", title, choices=[], multiple=True) for attr, title in LINK_CATEGORIES.items() ],
+                        ),
                     ),
 
-                    col_widths = (3,3,2,2,2),
+                    col_widths = (3,3,2,2,2,12,12),
                     id = "graph_cards"
                 ),
             ), 
@@ -244,7 +320,10 @@ def server(input, output, session):
     lf_idx = reactive.value(None)
     
     node_factories = reactive.value({})
-    G = reactive.value(nx.MultiDiGraph())
+    graph = reactive.value(nx.MultiDiGraph())
+    graph_version = reactive.value(0)
+    history = History(graph())
+    analytics = Analytics()
     SF = reactive.value(SigmaFactory())
     viz = reactive.value()
     
@@ -253,24 +332,190 @@ def server(input, output, session):
     dropdowns = ["source_col", "target_col", "link_type_col", "link_attrs", "node_label_col", "node_id_col", "node_type_col", "node_attrs"]
     columns = reactive.value([])
     connected_nodes = reactive.value([])
+    store = reactive.value(None)
+    store_version = reactive.value(None)
+    display_limit = 5000
+    max_expanded_nodes = 100000
+    max_hop_nodes = 20000
+    path_time_budget = 10
+    path_search = reactive.value(None)
+    preview = reactive.value(None)
+    
+    memory = governor.register(session.id, graph(), history)
+    session.on_ended(lambda: governor.unregister(session.id))
+    
+    # Every use of the graph goes through here, so one spilled to disk while idle is back before it's read
+    def G() -> nx.MultiDiGraph:
+        memory.touch()
+        return graph()
+    
+    history.before_change = memory.touch
+    
+    # The on-disk store describes G only as the on-disk build left it, so any other change to G drops it
+    def drop_store():
+        with reactive.isolate():
+            if store() is not None:
+                store().delete()
+                store.set(None)
+    
+    session.on_ended(drop_store)
+    
+    @reactive.effect
+    @reactive.event(graph_version)
+    def _():
+        if store() is not None and store_version() != history.version:
+            drop_store()
+    governor.start()
+    
+    # Indexes over G are cached between edits by what they were built from. They live here rather
+    # than in calcs so a spill can drop them without rerunning anything, and the next use rebuilds them.
+    indexes = {}
+    def cached_index(name:str, key:tuple, build):
+        memory.touch()
+        if name not in indexes or indexes[name][0] != key:
+            indexes[name] = (key, build())
+        return indexes[name][1]
+    
+    def ego_index():
+        max_degree = input.hub_limit() if input.exclude_hubs() else None
+        return cached_index("ego", (graph_version(), max_degree), lambda: Neighborhood(G(), max_nodes=max_expanded_nodes, max_per_hop=max_hop_nodes, max_degree=max_degree))
+    
+    @reactive.calc
+    def store_ego_index():
+        store_version()
+        return StoreNeighborhood(store(), max_nodes=max_expanded_nodes, max_per_hop=max_hop_nodes, max_degree=input.hub_limit() if input.exclude_hubs() else None)
+    
+    # The same bounded search over the on-disk store, when the graph was built there
+    def ego():
+        memory.touch()
+        return store_ego_index() if store() else ego_index()
+    
+    def hub_threshold():
+        return input.hub_limit() or 1000
+    
+    # Edits change G in place, so redraws are triggered by bumping the version
+    def graph_changed():
+        graph_version.set(graph_version() + 1)
+    
+    # Shows why the server can't take on `extra` more bytes for this session, if it can't
+    def over_budget(extra:int) -> bool:
+        message = governor.check(memory, extra)
+        if message:
+            ui.modal_show(get_modal(title="Not enough memory", prompt=message, buttons=[ui.modal_button("OK")]))
+        return message is not None
     
     def get_selected_nodes():
         try:
             if viz().get_selected_node():
                 selected = [ viz().get_selected_node() ]
             else:    
-                selected = input.selected_nodes()
+                selected = list(input.selected_nodes())
 
-            neighbors = []
             if input.and_neighbors():
-                for s in selected:
-                    neighbors += list(G().neighbors(s))
-                neighbors = list(set(neighbors))
-                selected += neighbors
+                neighbors = ego().expand(selected, input.neighbor_hops() or 1) - set(selected)
+                selected += list(neighbors)
             return selected  
         except Exception as e:
             return []
 
+    ### Memory
+    @reactive.effect(priority=-100)
+    def _():
+        graph_version()
+        memory.measure(frame=frame(), graph=G())
+    
+    # A spill runs from the governor's task, outside this session, and takes the widget and the
+    # indexes with the graph; a restore redraws, which builds them again as they're used
+    def drop_graph_state():
+        indexes.clear()
+        on_screen.update(index=None, visible=None)
+        with session_context(session), reactive.isolate():
+            widget = viz() if viz.is_set() else None
+            viz.set(None)
+        if widget is not None:
+            widget.close()
+    
+    def restore_graph_state():
+        with session_context(session), reactive.isolate():
+            graph_changed()
+    
+    memory.on_spill = drop_graph_state
+    memory.on_restore = restore_graph_state
+    
+    
+    ### Workspace
+    # State is saved by workspace id, so whichever worker process serves a reconnect can pick it up
+    workspace = reactive.value(None)
+    sessions = SessionStore()
+    sessions.cleanup(max_age=7 * 24 * 3600)
+    cleanup_snapshots(max_age=7 * 24 * 3600)
+    
+    # The id comes from the server; the tab only hands back the one it was given before
+    @reactive.effect
+    @reactive.event(input.workspace, ignore_none=False)
+    async def _():
+        if workspace() is not None:
+            return
+        ws = workspace_id(input.workspace())
+        if ws is not None and sessions.exists(ws):
+            restore_workspace(ws)
+        else:
+            ws = new_workspace_id()
+            await session.send_custom_message("workspace", ws)
+            if len(G()) > 0:
+                sessions.save_graph(ws, G(), history.aliases)
+        history.journal = []
+        workspace.set(ws)
+    
+    def restore_workspace(ws:str):
+        state = sessions.load_state(ws)
+        SF.set(state.sigma_factory)
+        node_factories.set(state.node_factories)
+        link_factories.set(state.link_factories)
+        if state.filename:
+            filename.set(state.filename)
+        df = sessions.load_frame(ws)
+        if df is not None:
+            frame.set(df)
+        try:
+            aliases = sessions.load_graph(ws, G())
+        except FileNotFoundError:
+            # the shared snapshot it was opened from has been cleaned up since
+            G().clear()
+            aliases = None
+            ui.notification_show("The graph saved in this workspace is no longer available.", duration=5)
+        if aliases is not None:
+            history.aliases = aliases
+            graph_changed()
+            if len(G()) > 0:
+                ui.update_accordion_panel(id="primary_accordion", target="Data", show=False)
+                ui.update_accordion_panel(id="primary_accordion", target="Graph", show=True)
+    
+    @reactive.effect(priority=-100)
+    def _():
+        ws = req(workspace())
+        sessions.save_state(ws, SessionState(
+            sigma_factory = SF(), 
+            node_factories = node_factories(), 
+            link_factories = link_factories(), 
+            aliases = history.aliases,
+            filename = filename() if filename.is_set() else None
+        ))
+    
+    # only the edits since the last save are written
+    @reactive.effect(priority=-100)
+    @reactive.event(workspace, graph_version)
+    def _():
+        ws = req(workspace())
+        records, history.journal = history.journal, []
+        sessions.save_changes(ws, G(), history.aliases, records or [])
+    
+    @reactive.effect(priority=-100)
+    @reactive.event(workspace, frame)
+    def _():
+        sessions.save_frame(req(workspace()), frame())
+    
+    
     ### Load Files      
     @reactive.Effect
     @reactive.event(input.file1)
@@ -282,11 +527,25 @@ def server(input, output, session):
         
         if filetype == 'text/csv':
             df = pd.read_csv(datapath).pipe(clean_columns)
-            frame.set(df)
+            if not over_budget(estimate_frame(df) - memory.usage.frame):
+                frame.set(df)
         
         elif filename()[-5:] == ".xlsx":
             df = pd.read_excel(datapath).pipe(clean_columns)
-            frame.set(df)
+            if not over_budget(estimate_frame(df) - memory.usage.frame):
+                frame.set(df)
+        
+        elif filename().endswith(".parquet") or filename().endswith(".arrow"):
+            df = (pd.read_parquet(datapath) if filename().endswith(".parquet") else pd.read_feather(datapath)).pipe(clean_columns)
+            if not over_budget(estimate_frame(df) - memory.usage.frame):
+                frame.set(df)
+        
+        elif filename().endswith(".zip"):
+            with history.edit("import tables") as edit:
+                edit.add_graph(import_tables(datapath))
+            graph_changed()
+            ui.update_accordion_panel(id="primary_accordion", target="Data", show=False)
+            ui.update_accordion_panel(id="primary_accordion", target="Graph", show=True)
         
         elif filetype == "application/octet-stream":
             if filename()[-4:] == ".qng":
@@ -307,16 +566,85 @@ def server(input, output, session):
             node_factories.set(gs.node_factories)                
             
             
+    # Sessions opening the same file share one read-only copy of it
+    def open_graph_file(filename):
+        def build():
+            with open(filename, 'r') as f:
+                graph_data = msgspec.json.decode(f.read(), type=QNG)
+            graph = graph_data.multigraph()
+            meta = {
+                "sigma_factory": msgspec.to_builtins(graph_data.sigma_factory), 
+                "aliases": graph_data.alias_index().canonical,
+                # files saved before hashes were stored get them now
+                "hashes": msgspec.to_builtins(graph_data.hashes if len(graph_data.hashes) > 0 else hash_graph(graph))
+            }
+            return graph, meta
+        return shared_snapshot(filename, build)
+    
+    def snapshot_graph(snapshot):
+        graph = nx.MultiDiGraph()
+        attach(graph, snapshot)
+        return graph
+    
+    def snapshot_hashes(snapshot) -> ContentHashes:
+        if "hashes" in snapshot.meta:
+            return msgspec.convert(snapshot.meta["hashes"], ContentHashes)
+        return hash_graph(snapshot_graph(snapshot))
+    
     def load_graph_file(filename):
-        with open(filename, 'r') as f:
-            graph_data = msgspec.json.decode(f.read(), type=QNG)
-        SF.set(graph_data.sigma_factory)
+        snapshot = open_graph_file(filename)
+        SF.set(msgspec.convert(snapshot.meta["sigma_factory"], SigmaFactory))
         
         if SF().edge_size:
             ui.update_select("edge_size_attribute", choices= [ None, *get_edge_keys(G())], selected = SF().edge_size)
         
         ui.update_select("node_color_attribute", choices = get_node_keys(G()), selected = SF().node_color)
-        G.set( nx.compose(G(), graph_data.multigraph()) )
+        diff = None
+        with history.edit("load graph") as edit:
+            edit.add_aliases(AliasIndex.from_mapping(snapshot.meta["aliases"]))
+            if len(G()) == 0:
+                edit.attach(snapshot)
+            else:
+                # only what the file adds or changes is merged in
+                base = snapshot_graph(snapshot)
+                H = history.aliases.rewrite_graph(base)
+                diff = diff_graphs(hash_graph(G()), snapshot_hashes(snapshot) if H is base else hash_graph(H))
+                edit.add_graph(H, diff)
+        graph_changed()
+        if diff is not None:
+            show_diff(diff, title="Merged graph", highlight=False)
+    
+    
+    def show_diff(diff, title:str, highlight:bool):
+        summary = [ ui.tags.li(f"{label}: {count}") for label, count in diff.summary().items() ]
+        prompt = ui.TagList(ui.tags.ul(summary)) if len(diff) > 0 else "No differences."
+        ui.modal_show(get_modal(title=title, prompt=prompt, buttons=[ui.modal_button("OK")]))
+        if highlight and len(diff) > 0:
+            status = diff.node_status()
+            diff_SF = SigmaFactory(
+                layout_settings = {"StrongGravityMode": False}, 
+                node_color_palette = None, 
+                node_color = lambda n: status.get(n, "unchanged")
+            )
+            try:
+                layout = viz().get_layout()
+                camera_state = viz().get_camera_state()
+            except Exception as e:
+                print(e)
+                layout, camera_state = None, {}
+            viz.set(diff_SF.make_sigma(G(), node_colors={"added": "#2ca02c", "changed": "#ff7f0e", "unchanged": "#d3d3d3"}, layout=layout, camera_state=camera_state))
+    
+    
+    # What changed in this graph since a saved copy of it
+    @reactive.effect
+    @reactive.event(input.compare_file)
+    def _():
+        f: list[FileInfo] = input.compare_file()
+        # read once for its hashes, not published as a snapshot nobody will open again
+        with open(f[0]['datapath'], 'r') as file:
+            saved = msgspec.json.decode(file.read(), type=QNG)
+        diff = diff_graphs(saved.hashes if len(saved.hashes) > 0 else hash_graph(saved.multigraph()), hash_graph(G()))
+        show_diff(diff, title=f"Changes since {f[0]['name']}", highlight=input.highlight_diff())
 
     
     @reactive.Effect 
@@ -340,6 +668,9 @@ def server(input, output, session):
     def update_column_lists():
         for box in dropdowns:        
             ui.update_selectize(box, choices=columns())
+        ui.update_select("grid_sort", choices={"": "File order", **{ c: c for c in columns() }})
+        ui.update_select("grid_filter_col", choices={"": "No filter", **{ c: c for c in columns() }})
+        ui.update_select("preview_stratify", choices={"": "Random rows", **{ c: f"Every value of {c}" for c in columns() }})
 
         
     @reactive.Effect
@@ -459,47 +790,150 @@ def server(input, output, session):
 
     # graph option dropdowns
     @reactive.Effect 
-    @reactive.event(G)
+    @reactive.event(G, graph_version)
     def _():
          edge_keys = [ None, *get_edge_keys(G())]
          node_keys = get_node_keys(G())
          ui.update_select(id = "edge_size_attribute", choices=edge_keys, selected = None)
          ui.update_select(id = "node_color_attribute", choices=node_keys, selected = "type")
+         ui.update_select(id = "node_size_attribute", choices=[ None, *node_keys ], selected = None)
+         ui.update_select(id = "timeline_start", choices=edge_keys, selected = None)
+         ui.update_select(id = "timeline_end", choices=edge_keys, selected = None)
 
 
     ### Build the Graph
     @reactive.Effect
     @reactive.event(input.build_graph, input.tidy)
-    def _():
+    async def _():
         gf = GraphFactory(
-            node_factories = node_factories().values(),
+            node_factories = list(node_factories().values()),
             link_factories = link_factories()
         )
         
-        graph = G().copy()
-        graph = nx.compose(graph, gf.make_graphs([row for row in frame().to_dict('records')], filename()))
-
-        if input.tidy() is True and len(G()) > 0:
-            graph = tidy_up(graph, ignore_middle_initial=True)
-    
+        rows = min(len(frame()), display_limit) if input.on_disk() else len(frame())
+        if over_budget(estimate_build(rows, len(node_factories()), len(link_factories()))):
+            return
+        
+        # the build and the search for duplicates run in the compute pool, off this worker's event loop
+        ui.notification_show("Building graph...", id="build", duration=None)
+        if input.on_disk():
+            if store() is None or store_version() != history.version:
+                drop_store()
+                store.set(GraphStore.temporary())
+            gf.store_graphs(iter_columns(frame()), filename(), store(), aliases=history.aliases)
+            H = store().subgraph(store().first_nodes(display_limit))
+        elif pool.workers > 1 and len(frame()) >= PARALLEL_ROWS:
+            # big files are split into row ranges, one per compute worker
+            H = await parallel_graph(gf, frame(), filename(), pool, aliases=history.aliases)
+        else:
+            H = await pool.run(gf.graph_from_columns, frame_columns(frame()), filename(), aliases=history.aliases)
+        
+        duplicates = []
+        if input.tidy() is True and len(G()) + len(H) > 0:
+            duplicates = await pool.run(find_duplicates, nx.compose(tidy_graph(G()), tidy_graph(H)), True)
+        ui.notification_remove("build")
+        
+        with history.edit("build graph") as edit:
+            edit.add_graph(H)
+            tidy_up(G(), combine=edit.combine_nodes, duplicates=duplicates)
+        if input.on_disk():
+            store_version.set(history.version)
     
-        G.set(graph)
+        graph_changed()
         build_count.set( build_count() + 1 )
-        if len(graph) > 0:
+        show_build_report(
+            skipped = null_counts(frame(), gf.key_fields()), 
+            quarantined = null_rows(frame(), gf.key_fields()), 
+            hubs = get_hubs(G(), hub_threshold())
+        )
+        if input.release_frame() and len(G()) > 0:
+            frame.set(pd.DataFrame())
+        if len(G()) > 0:
             ui.update_accordion_panel(id="primary_accordion", target="Data", show=False)
             ui.update_accordion_panel(id="primary_accordion", target="Graph", show=True)
 
 
+    ### Preview the Build
+    # A sample of rows built right away, and what the whole file would make, before paying for the full build
+    @reactive.Effect
+    @reactive.event(input.preview_graph)
+    async def _():
+        req(len(frame()) > 0, len(link_factories()) > 0 or len(node_factories()) > 0)
+        gf = GraphFactory(
+            node_factories = list(node_factories().values()),
+            link_factories = link_factories()
+        )
+        ui.notification_show("Estimating graph size...", id="preview", duration=None)
+        # only the key columns go to the worker, through shared memory
+        keys = [ f for f in gf.key_fields() if f in frame().columns ]
+        projection = await run_shared(pool, frame()[keys], project_graph, gf, hub_threshold())
+        sample = sample_frame(frame(), input.preview_rows() or 2000, input.preview_stratify() or None)
+        H = gf.graph_from_columns(frame_columns(sample), filename(), aliases=history.aliases)
+        ui.notification_remove("preview")
+        preview.set((projection, H, len(sample)))
+        
+    @render.ui
+    def build_preview():
+        req(preview())
+        projection, H, rows = preview()
+        estimates = pd.DataFrame([
+            {"": "Nodes", "Whole file (estimated)": f"{projection.nodes:,}", "Preview": f"{len(H):,}"},
+            {"": "Links", "Whole file (estimated)": f"{projection.links:,}", "Preview": f"{H.number_of_edges():,}"},
+            {"": f"Nodes with more than {projection.hub_threshold} links", "Whole file (estimated)": f"{projection.hubs:,}", "Preview": f"{len(get_hubs(H, projection.hub_threshold)):,}"},
+            *[ {"": f"Distinct {field}", "Whole file (estimated)": f"{n:,}", "Preview": ""} for field, n in projection.ids.items() ],
+        ])
+        return ui.card(
+            ui.card_header(f"Preview: {rows:,} of {projection.rows:,} rows"),
+            ui.layout_columns(
+                ui.HTML(estimates.to_html(index=False, classes="table table-sm")),
+                output_widget("preview_sigma"),
+                col_widths=(4, 8),
+            ),
+            ui.card_footer(ui.input_action_button("close_preview", "Close")),
+        )
+    
+    @render_widget
+    def preview_sigma():
+        req(preview())
+        return SF().make_sigma(preview()[1])
+    
+    @reactive.Effect
+    @reactive.event(input.close_preview, input.build_graph)
+    def _():
+        preview.set(None)
+
+
+    def show_build_report(skipped:dict, quarantined:pd.DataFrame, hubs:list):
+        skipped = { c: n for c, n in skipped.items() if n > 0 }
+        if len(skipped) == 0 and len(hubs) == 0:
+            return
+        
+        report = []
+        if len(skipped) > 0:
+            report.append(ui.tags.p(f"{len(quarantined)} rows were left out of some links or nodes because a column was blank:"))
+            report.append(ui.tags.ul([ ui.tags.li(f"{c}: {n} blank") for c, n in skipped.items() ]))
+            report.append(ui.HTML(quarantined.head(10).to_html(index=False, classes="table table-sm")))
+        if len(hubs) > 0:
+            report.append(ui.tags.p(f"{len(hubs)} nodes have more than {hub_threshold()} links. Check 'Don't search through hubs' to keep searches from going through them:"))
+            report.append(ui.tags.ul([ ui.tags.li(f"{G().nodes[n].get('label', n)} ({d} links)") for n, d in hubs[:10] ]))
+        
+        ui.modal_show(get_modal(title="Graph built", prompt=ui.TagList(*report), buttons=[ui.modal_button("OK")], size="l"))
+
+
     # Update SigmaFactory when style controls are updated 
     @reactive.Effect 
-    @reactive.event(input.edge_size_attribute, input.node_color_attribute, input.clear_paths, input.show_all_labels)
+    @reactive.event(input.edge_size_attribute, input.node_color_attribute, input.node_size_attribute, input.clear_paths, input.show_all_labels)
     def _():
         
         params = SF().to_dict()        
         params = {p: params[p] for p in params if p not in ['edge_weight', 'edge_size', 'node_size']} # Reset edge sizes
         params["node_color"] = input.node_color_attribute()
+        params["node_color_gradient"] = "Viridis" if input.node_color_attribute() in CONTINUOUS_METRICS else None
         params["show_all_labels"] = input.show_all_labels()
-        params["layout"] = viz().get_layout()
+        params["layout"] = viz().get_layout() if viz() is not None else None
+
+        if len(input.node_size_attribute()) > 0:
+            params['node_size'] = input.node_size_attribute()
 
         if len(input.edge_size_attribute()) > 0:
             for n in G(): 
@@ -512,25 +946,70 @@ def server(input, output, session):
         SF.set(SigmaFactory(**params))
 
 
+    # Make graph widget; the only place the whole graph is drawn, so hidden categories stay hidden after edits
     @reactive.effect
-    @reactive.event(G, SF) 
+    @reactive.event(G, graph_version, SF) 
     def _():
         print("updating viz")
+        draw_visible()
+    
+    def draw(graph:nx.MultiDiGraph):
         try:
             layout = viz().get_layout()
             camera_state = viz().get_camera_state()
-            viz.set(SF().make_sigma(G(), layout = layout, camera_state = camera_state))
+            viz.set(SF().make_sigma(graph, layout = layout, camera_state = camera_state))
         except Exception as e:
             print(e)
-            viz.set(SF().make_sigma(G()))
+            viz.set(SF().make_sigma(graph))
+
+
+    ### Hide categories
+    def visibility():
+        return cached_index("visibility", (graph_version(),), lambda: VisibilityIndex(G()))
+    
+    def hidden() -> tuple[dict, dict]:
+        return (
+            { attr: set(input[f"hide_nodes_{attr}"]()) for attr in NODE_CATEGORIES },
+            { attr: set(input[f"hide_links_{attr}"]()) for attr in LINK_CATEGORIES },
+        )
+    
+    def visible_graph() -> nx.MultiDiGraph:
+        with reactive.isolate():
+            return visibility().subgraph(*hidden())
+    
+    # What was last drawn: the index and which nodes and links it showed
+    on_screen = {"index": None, "visible": None}
+    
+    def draw_visible(only_if_changed:bool = False):
+        with reactive.isolate():
+            index = visibility()
+            visible = index.visible(*hidden())
+        if only_if_changed and index is on_screen["index"] and visible == on_screen["visible"]:
+            return
+        on_screen.update(index=index, visible=visible)
+        draw(visible_graph())
+    
+    @reactive.effect
+    def _():
+        index = visibility()
+        with reactive.isolate():
+            hidden_nodes, hidden_links = hidden()
+        for attr in NODE_CATEGORIES:
+            ui.update_selectize(f"hide_nodes_{attr}", choices=index.values(attr), selected=list(hidden_nodes[attr]))
+        for attr in LINK_CATEGORIES:
+            ui.update_selectize(f"hide_links_{attr}", choices=index.values(attr, links=True), selected=list(hidden_links[attr]))
+    
+    # Keeps the layout and camera, so hidden nodes come back where they were.
+    # A toggle that hides nothing new (say, a type whose nodes are all hidden already) isn't redrawn.
+    @reactive.effect
+    @reactive.event(*[ input[f"hide_nodes_{attr}"] for attr in NODE_CATEGORIES ], *[ input[f"hide_links_{attr}"] for attr in LINK_CATEGORIES ], ignore_init=True)
+    def _():
+        draw_visible(only_if_changed=True)
             
     
     def get_connected_to_selected():
         selected = get_selected_nodes()
-        connected = {}
-        for s in selected:
-            connected.update(get_connected_nodes(G(), s, connected))
-        return connected 
+        return ego().expand(selected, input.subgraph_hops() or None)
 
 
     @reactive.effect
@@ -548,7 +1027,8 @@ def server(input, output, session):
                 )
                 layout = viz().get_layout()
                 camera_state = viz().get_camera_state()
-                viz.set(selected_SF.make_sigma(G(), node_colors="Dark2", layout=layout, camera_state=camera_state))
+                graph = nx.compose(G(), store().subgraph(connected)) if store() else G()
+                viz.set(selected_SF.make_sigma(graph, node_colors="Dark2", layout=layout, camera_state=camera_state))
             else:
                 m = get_modal(
                     title="You didn't select anything",
@@ -564,8 +1044,11 @@ def server(input, output, session):
         connected = get_connected_to_selected()
         if len(connected) == 0 and len(connected_nodes()) > 0:
             connected = connected_nodes()
-        graph = nx.induced_subgraph(G(), connected)
-        G.set(graph)
+        with history.edit("keep subgraph") as edit:
+            edit.keep_nodes(connected)
+            if store():
+                edit.add_graph(store().subgraph(connected))
+        graph_changed()
         
     
     @reactive.effect
@@ -574,15 +1057,41 @@ def server(input, output, session):
         connected = get_connected_to_selected()
         if len(connected) == 0 and len(connected_nodes()) > 0:
             connected = connected_nodes()
-        graph = G().copy()
-        graph.remove_nodes_from(connected)
-        G.set(graph)
+        with history.edit("remove subgraph") as edit:
+            edit.remove_nodes(connected)
+        graph_changed()
         
     @reactive.effect
-    @reactive.event(input.cancel_subgraph, input.clear_paths)
+    @reactive.event(input.cancel_subgraph, input.clear_paths, input.clear_timeline)
     def _():
-        graph = G().copy()
-        G.set(graph)
+        graph_changed()
+
+
+    ### Timeline
+    def timeline():
+        start, end = input.timeline_start(), input.timeline_end() or None
+        if not start:
+            return None
+        return cached_index("timeline", (graph_version(), start, end), lambda: TemporalIndex(G(), start, end))
+    
+    @reactive.effect
+    def _():
+        date_range = req(timeline()).date_range()
+        if date_range:
+            ui.update_slider("timeline", min=date_range[0], max=date_range[1], value=date_range)
+    
+    @reactive.effect
+    @reactive.event(input.timeline)
+    def _():
+        first, last = input.timeline()
+        TG = req(timeline()).subgraph(first, last)
+        try:
+            layout = viz().get_layout()
+            camera_state = viz().get_camera_state()
+            viz.set(SF().make_sigma(TG, layout = layout, camera_state = camera_state))
+        except Exception as e:
+            print(e)
+            viz.set(SF().make_sigma(TG))
 
 
     # Show Simple Paths
@@ -590,16 +1099,105 @@ def server(input, output, session):
     @reactive.event(input.show_paths)        
     def _():
         print("generating path graph")
-        PG = path_graph = get_path_graph(G(), input.path_start(), input.path_end())
-        viz.set(SF().make_sigma(PG))
+        if store():
+            PG = path_graph = store().path_graph(input.path_start(), input.path_end())
+            viz.set(SF().make_sigma(PG))
+        else:
+            hubs = set(n for n, _ in get_hubs(G(), hub_threshold())) if input.exclude_hubs() else set()
+            path_search.set(PathSearch(
+                G(), input.path_start(), input.path_end(), 
+                cutoff = input.path_cutoff() or None, 
+                max_paths = input.max_paths() or None, 
+                time_budget = path_time_budget, 
+                exclude = hubs
+            ))
+    
+    # a search can't keep walking a graph that's being edited
+    @reactive.effect
+    @reactive.event(input.clear_paths, graph_version)
+    def _():
+        path_search.set(None)
+    
+    # Paths are shown as they're found, one batch per reactive cycle, shortest first
+    @reactive.effect
+    def _():
+        search = req(path_search())
+        with reactive.isolate():
+            show_path_batch(search)
+        if not search.done:
+            reactive.invalidate_later(0.05)
+    
+    def show_path_batch(search):
+        batch = search.next_batch()
+        if len(batch) > 0:
+            PG = nx.induced_subgraph(G(), list(search.nodes))
+            try:
+                layout = viz().get_layout()
+                camera_state = viz().get_camera_state()
+            except Exception as e:
+                print(e)
+                layout, camera_state = None, {}
+            viz.set(SF().make_sigma(PG, layout = layout, camera_state = camera_state))
+        
+        if not search.done:
+            return
+        if search.count == 0:
+            ui.modal_show(get_modal(title="No paths", prompt="Those two nodes aren't connected within that many links.", buttons=[ui.modal_button("OK")]))
+        elif search.stopped != "complete":
+            reason = f"the {path_time_budget} second limit" if search.stopped == "time" else f"{search.count} paths"
+            ui.notification_show(f"Stopped at {reason}. Showing the shortest {search.count} paths found.", duration=5)
 
          
          
     ### OUTPUTS 
                 
+    ### Spreadsheet Preview
+    # Only the page being looked at goes to the browser; sorting and filtering happen here
+    @reactive.calc
+    def grid_index():
+        return FrameIndex(frame())
+    
+    @reactive.calc
+    def grid_rows():
+        return grid_index().rows(input.grid_sort() or None, input.grid_descending(), input.grid_filter_col() or None, input.grid_filter())
+    
+    def grid_window() -> tuple[int, int]:
+        size = int(input.grid_page_size())
+        pages = max(1, -(-len(grid_rows()) // size))
+        page = min(max(input.grid_page() or 1, 1), pages)
+        return (page - 1) * size, size
+    
+    @reactive.Effect
+    @reactive.event(input.grid_sort, input.grid_descending, input.grid_filter_col, input.grid_filter, input.grid_page_size, frame)
+    def _():
+        ui.update_numeric("grid_page", value=1)
+    
+    @render.text
+    def grid_status():
+        req(len(frame()) > 0)
+        start, size = grid_window()
+        shown = len(grid_rows())
+        matched = f" (of {len(frame()):,} rows)" if shown < len(frame()) else ""
+        return f"Rows {min(start + 1, shown):,}-{min(start + size, shown):,} of {shown:,}{matched}"
+    
     @render.data_frame
     def user_data():
-        return render.DataGrid(frame(), width="100%")
+        start, size = grid_window()
+        return render.DataGrid(grid_index().page(grid_rows(), start, size), width="100%")
+    
+    @render.ui
+    def column_summaries():
+        req(len(frame()) > 0)
+        summaries = pd.DataFrame([
+            {
+                "Column": s.column, 
+                "Distinct": f"{s.distinct:,}", 
+                "Blank": f"{s.blank:.1%}", 
+                "Most common": ", ".join(f"{v} ({n:,})" for v, n in s.top)
+            }
+            for s in grid_index().summarize()
+        ])
+        return ui.tags.details(ui.tags.summary("Column summaries"), ui.HTML(summaries.to_html(index=False, classes="table table-sm")))
         
     @render.data_frame
     @reactive.event(link_factories) 
@@ -669,7 +1267,9 @@ def server(input, output, session):
     @reactive.effect
     @reactive.event(input.remove)
     def _():
-        G().remove_nodes_from(get_selected_nodes())
+        with history.edit("remove") as edit:
+            edit.remove_nodes(get_selected_nodes())
+        graph_changed()
     
     
     ### Merge selected nodes
@@ -678,8 +1278,43 @@ def server(input, output, session):
     def _():
         selected = get_selected_nodes()
         print("Merging", selected)
-        new_graph = combine_nodes(G(), selected)
-        G.set(new_graph)
+        with history.edit("merge") as edit:
+            edit.combine_nodes(G(), selected)
+        graph_changed()
+      
+    
+    ### Analytics
+    @reactive.effect
+    @reactive.event(input.compute_metric)
+    async def _():
+        metric = input.metric()
+        values = analytics.cached(history.version, metric)
+        if values is None:
+            ui.notification_show(f"Computing {METRICS[metric]}...", id="analytics", duration=None)
+            values = await asyncio.wrap_future(analytics.submit(G(), history.version, metric))
+            ui.notification_remove("analytics")
+        
+        # recorded like any edit, so undo and workspace restores keep the results
+        with history.edit(f"compute {METRICS[metric]}") as edit:
+            edit.set_node_values(metric, values)
+        graph_changed()
+        node_keys = get_node_keys(G())
+        ui.update_select("node_size_attribute", choices=[ None, *node_keys ], selected=input.node_size_attribute())
+        ui.update_select("node_color_attribute", choices=node_keys, selected=metric)
+    
+    
+    ### Undo / redo graph edits
+    @reactive.effect
+    @reactive.event(input.undo)
+    def _():
+        if history.undo():
+            graph_changed()
+    
+    @reactive.effect
+    @reactive.event(input.redo)
+    def _():
+        if history.redo():
+            graph_changed()
       
       
     def update_node_choices(graph):
@@ -694,37 +1329,36 @@ def server(input, output, session):
     
     @reactive.effect
     def _():
+        graph_version()
         update_node_choices(G())
     
-    # Make graph widget
-    @reactive.effect
-    @reactive.event(G) 
-    def _():
-        try:
-            layout = viz().get_layout()
-            camera_state = viz().get_camera_state()
-            viz.set(SF().make_sigma(G(), layout = layout, camera_state = camera_state))
-        except Exception as e:
-            print(e)
-            viz.set(SF().make_sigma(G()))
-    
-    
     # Render graph 
     @render_widget(height="800px")
     @reactive.event(viz)
     def sigma_graph():
         return viz()
         
-    @render.download(filename="graph_export.html")
+    @render.download(filename=lambda: "graph_export.html.gz" if input.export_gzip() else "graph_export.html")
     def export_graph():
-        return SigmaFactory().export_graph(G())
+        try:
+            layout = viz().get_layout()
+            camera_state = viz().get_camera_state()
+        except Exception as e:
+            print(e)
+            layout, camera_state = None, {}
+        return SF().export_graph(G(), layout = layout, camera_state = camera_state, compress = input.export_gzip())
+    
+    
+    @render.download(filename=lambda: f"graph_tables_{input.table_format()}.zip")
+    def save_tables():
+        yield from export_tables(G(), input.table_format())
     
     
     @render.download(filename="quick_network_graph.qng")
     def save_graph_data():
         adj = nx.to_dict_of_dicts(G())
         attrs = { n: G().nodes[n] for n in G().nodes()}
-        qng = QNG(adjacency=adj, node_attrs=attrs, sigma_factory=SF())
+        qng = QNG(adjacency=adj, node_attrs=attrs, sigma_factory=SF(), aliases=history.aliases.canonical, hashes=hash_graph(G()))
         yield msgspec.json.encode(qng)
         
     
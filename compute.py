@@ -0,0 +1,41 @@
+import os
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, Future
+
+
+# Heavy work (builds, finding duplicates) runs in separate processes, so one session's
+# big build doesn't stall every other session on the same worker. With no workers it runs inline.
+class ComputePool:
+
+    def __init__(self, workers:int = 2):
+        self.workers = workers
+        self.executor = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(workers=int(os.environ.get("QNG_COMPUTE_WORKERS", 2)))
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        if self.workers == 0:
+            future = Future()
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        if self.executor is None:
+            # spawned rather than forked: the app process has threads and an event loop running
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self.executor.submit(fn, *args, **kwargs)
+
+    async def run(self, fn, *args, **kwargs):
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+
+pool = ComputePool.from_env()
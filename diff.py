@@ -0,0 +1,77 @@
+import hashlib
+import msgspec
+import networkx as nx
+from qng import ContentHashes
+
+
+# Sorted keys, so the same attributes always hash the same however they were added
+encoder = msgspec.msgpack.Encoder(order="sorted", enc_hook=str)
+
+
+def content_hash(attrs:dict) -> str:
+    return hashlib.blake2b(encoder.encode(attrs), digest_size=8).hexdigest()
+
+
+# Link keys become strings, the way they come back from a saved file
+def edge_id(u, v, k) -> tuple:
+    return (u, v, str(k))
+
+
+def hash_graph(G:nx.MultiDiGraph) -> ContentHashes:
+    return ContentHashes(
+        nodes = { n: content_hash(attrs) for n, attrs in G.nodes(data=True) },
+        edges = [ [*edge_id(u, v, k), content_hash(attrs)] for u, v, k, attrs in G.edges(keys=True, data=True) ]
+    )
+
+
+def compare(old:dict, new:dict) -> tuple[list, list, list]:
+    added = [ i for i in new if i not in old ]
+    removed = [ i for i in old if i not in new ]
+    changed = [ i for i, h in new.items() if i in old and old[i] != h ]
+    return added, removed, changed
+
+
+class GraphDiff(msgspec.Struct):
+    added_nodes : list = []
+    removed_nodes : list = []
+    changed_nodes : list = []
+    added_edges : list = []
+    removed_edges : list = []
+    changed_edges : list = []
+
+    def __len__(self):
+        return sum(len(getattr(self, f)) for f in self.__struct_fields__)
+
+    def summary(self) -> dict:
+        return {
+            "Nodes added": len(self.added_nodes),
+            "Nodes removed": len(self.removed_nodes),
+            "Nodes changed": len(self.changed_nodes),
+            "Links added": len(self.added_edges),
+            "Links removed": len(self.removed_edges),
+            "Links changed": len(self.changed_edges),
+        }
+
+    # What needs copying from the new graph to bring the old one up to date
+    def new_nodes(self) -> set:
+        return set(self.added_nodes) | set(self.changed_nodes)
+
+    def new_edges(self) -> set:
+        return set(self.added_edges) | set(self.changed_edges)
+
+    # "added" or "changed" for each node in the new graph that differs, counting nodes whose links changed
+    def node_status(self) -> dict:
+        status = { n: "changed" for e in self.added_edges + self.changed_edges for n in e[:2] }
+        status.update({ n: "changed" for n in self.changed_nodes })
+        status.update({ n: "added" for n in self.added_nodes })
+        return status
+
+
+# Linear in the size of both graphs: only hashes are compared
+def diff_graphs(old:ContentHashes, new:ContentHashes) -> GraphDiff:
+    added_nodes, removed_nodes, changed_nodes = compare(old.nodes, new.nodes)
+    added_edges, removed_edges, changed_edges = compare(old.edge_hashes(), new.edge_hashes())
+    return GraphDiff(
+        added_nodes = added_nodes, removed_nodes = removed_nodes, changed_nodes = changed_nodes,
+        added_edges = added_edges, removed_edges = removed_edges, changed_edges = changed_edges
+    )
@@ -0,0 +1,91 @@
+import msgspec
+import numpy as np
+import pandas as pd
+from itertools import islice
+from qng import is_null
+
+
+class ColumnSummary(msgspec.Struct):
+    column : str
+    distinct : int
+    blank : float
+    top : list[tuple[str, int]] = []
+
+
+# Serves the spreadsheet preview a page at a time. Each column is factorized once, the first time it's
+# sorted, filtered or summarized, so later sorts and filters work on integer codes, not the values.
+class FrameIndex:
+
+    def __init__(self, df:pd.DataFrame):
+        self.df = df
+        self.factorized = {}
+        self.ranks = {}
+        self.orders = {}
+        self.summaries = None
+
+    def __len__(self):
+        return len(self.df)
+
+    def codes(self, column:str) -> tuple[np.ndarray, np.ndarray]:
+        if column not in self.factorized:
+            codes, uniques = pd.factorize(self.df[column])
+            self.factorized[column] = (codes, np.asarray(uniques, dtype=object))
+        return self.factorized[column]
+
+    # Each row's position in the column's sorted distinct values, with blanks last
+    def sort_keys(self, column:str) -> np.ndarray:
+        if column not in self.ranks:
+            codes, uniques = self.codes(column)
+            try:
+                order = pd.Index(uniques).argsort()
+            except TypeError:
+                # mixed numbers and text sort as text
+                order = pd.Index(uniques.astype(str)).argsort()
+            rank = np.empty(len(uniques) + 1, dtype=np.int64)
+            rank[order] = np.arange(len(uniques))
+            rank[-1] = len(uniques)
+            self.ranks[column] = rank[codes]
+        return self.ranks[column]
+
+    def order(self, column:str, descending:bool = False) -> np.ndarray:
+        if (column, descending) not in self.orders:
+            keys = self.sort_keys(column)
+            if descending:
+                # blanks stay last
+                blank = len(self.codes(column)[1])
+                keys = np.where(keys == blank, blank, blank - 1 - keys)
+            self.orders[(column, descending)] = np.argsort(keys, kind="stable")
+        return self.orders[(column, descending)]
+
+    # Rows whose value contains text, ignoring case; each distinct value is checked once
+    def matches(self, column:str, text:str) -> np.ndarray:
+        codes, uniques = self.codes(column)
+        text = text.lower()
+        hits = np.array([ text in str(u).lower() for u in uniques ] + [False], dtype=bool)
+        return hits[codes]
+
+    def rows(self, sort:str|None = None, descending:bool = False, filter_column:str|None = None, filter_text:str = "") -> np.ndarray:
+        rows = self.order(sort, descending) if sort in self.df else np.arange(len(self.df))
+        if filter_column in self.df and filter_text:
+            rows = rows[self.matches(filter_column, filter_text)[rows]]
+        return rows
+
+    def page(self, rows:np.ndarray, start:int, size:int) -> pd.DataFrame:
+        return self.df.iloc[rows[start:start + size]]
+
+    def summarize(self, top:int = 3) -> list[ColumnSummary]:
+        if self.summaries is None:
+            self.summaries = []
+            for column in self.df.columns:
+                codes, uniques = self.codes(column)
+                counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+                blank_values = np.array([ is_null(u) for u in uniques ], dtype=bool)
+                blank = int(np.count_nonzero(codes < 0) + counts[blank_values].sum())
+                most = list(islice(( i for i in np.argsort(-counts, kind="stable") if not blank_values[i] ), top))
+                self.summaries.append(ColumnSummary(
+                    column = str(column),
+                    distinct = int(np.count_nonzero(~blank_values)),
+                    blank = blank / len(codes) if len(codes) > 0 else 0,
+                    top = [ (str(uniques[i]), int(counts[i])) for i in most ]
+                ))
+        return self.summaries
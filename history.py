@@ -0,0 +1,340 @@
+import zlib
+import msgspec
+import networkx as nx
+from contextlib import contextmanager
+from qng import AliasIndex
+from snapshot import GraphSnapshot, attach, detach, open_snapshot
+from diff import GraphDiff, edge_id
+
+
+class Delta(msgspec.Struct):
+    label : str
+    ops : list = []
+
+    def __len__(self):
+        return len(self.ops)
+
+
+def set_attrs(attrs:dict, values:dict):
+    attrs.clear()
+    attrs.update(values)
+
+
+def apply(G:nx.MultiDiGraph, aliases:AliasIndex, op:tuple, reverse:bool = False):
+    action = op[0]
+    if action == "alias":
+        if reverse:
+            aliases.split(op[1], op[2])
+        else:
+            for other_root, ids in op[2]:
+                aliases.union(op[1], [other_root])
+        return
+
+    if action == "attach":
+        if reverse:
+            detach(G)
+        else:
+            attach(G, op[1])
+        return
+
+    # one attribute on many nodes, e.g. a metric; nodes that didn't have it lose it again on undo
+    if action == "set_values":
+        attr, before, missing, after = op[1:]
+        if reverse:
+            for n, value in before.items():
+                G.nodes[n][attr] = value
+            for n in missing:
+                del G.nodes[n][attr]
+        else:
+            for n, value in after.items():
+                G.nodes[n][attr] = value
+        return
+
+    if action in ["set_node", "set_edge"]:
+        *target, before, after = op[1:]
+        attrs = G.nodes[target[0]] if action == "set_node" else G.edges[tuple(target)]
+        set_attrs(attrs, before if reverse else after)
+        return
+
+    # Added nodes and links are recorded by id only. Undo moves their attributes into the op's
+    # stash on the way out, and redo puts them back, so only undone additions hold attributes.
+    if action == "add_nodes":
+        ids, stash = op[1], op[2]
+        if reverse:
+            stash[:] = [ G.nodes[n] for n in ids ]
+            G.remove_nodes_from(ids)
+        else:
+            G.add_nodes_from(zip(ids, stash) if stash else ids)
+            stash.clear()
+        return
+
+    if action == "add_edges":
+        keys, stash = op[1], op[2]
+        if reverse:
+            stash[:] = [ G.edges[u, v, k] for u, v, k in keys ]
+            G.remove_edges_from(keys)
+        else:
+            G.add_edges_from(( (u, v, k, attrs) for (u, v, k), attrs in zip(keys, stash) ) if stash else keys)
+            stash.clear()
+        return
+
+    # removed nodes and links keep the attribute dicts the graph let go of
+    if action == "remove_node":
+        if reverse:
+            G.add_node(op[1], **op[2])
+        else:
+            G.remove_node(op[1])
+    elif action == "remove_edge":
+        if reverse:
+            G.add_edge(op[1], op[2], key=op[3], **op[4])
+        else:
+            G.remove_edge(op[1], op[2], key=op[3])
+
+
+def encode_graph(G:nx.MultiDiGraph, aliases:AliasIndex) -> bytes:
+    nodes = list(G.nodes(data=True))
+    edges = list(G.edges(keys=True, data=True))
+    return zlib.compress(msgspec.msgpack.encode([nodes, edges, aliases]))
+
+
+def decode_graph(data:bytes, G:nx.MultiDiGraph) -> AliasIndex:
+    nodes, edges, aliases = msgspec.msgpack.decode(zlib.decompress(data))
+    G.clear()
+    G.add_nodes_from(nodes)
+    G.add_edges_from(edges)
+    return msgspec.convert(aliases, AliasIndex)
+
+
+# An op as it can be replayed on a saved copy of the graph: additions carry their attributes
+# (read from G just after they were made) and snapshots are referred to by path
+def replay_op(G:nx.MultiDiGraph, op:tuple, reverse:bool) -> tuple:
+    action = op[0]
+    if action == "attach":
+        return ("attach", op[1].path)
+    if action == "add_nodes":
+        return (action, op[1], [] if reverse else [ G.nodes[n] if n in G else {} for n in op[1] ])
+    if action == "add_edges":
+        return (action, op[1], [] if reverse else [ G.edges[u, v, k] if G.has_edge(u, v, k) else {} for u, v, k in op[1] ])
+    return op
+
+
+def encode_ops(G:nx.MultiDiGraph, ops:list, reverse:bool = False) -> bytes:
+    return zlib.compress(msgspec.msgpack.encode([ (replay_op(G, op, reverse), reverse) for op in ops ]))
+
+
+def replay(data:bytes, G:nx.MultiDiGraph, aliases:AliasIndex):
+    for op, reverse in msgspec.msgpack.decode(zlib.decompress(data)):
+        if op[0] == "attach":
+            op = ("attach", open_snapshot(op[1]))
+        apply(G, aliases, op, reverse)
+
+
+# Records the changes one edit makes to the graph, applying them in place as it goes
+class Edit:
+
+    def __init__(self, G:nx.MultiDiGraph, label:str, aliases:AliasIndex):
+        self.G = G
+        self.aliases = aliases
+        self.delta = Delta(label=label)
+
+    def remove_nodes(self, nodes):
+        G = self.G
+        for n in [ n for n in dict.fromkeys(nodes) if n in G ]:
+            edges = list(G.out_edges(n, keys=True, data=True)) + [ e for e in G.in_edges(n, keys=True, data=True) if e[0] != n ]
+            for u, v, k, d in edges:
+                self.delta.ops.append(("remove_edge", u, v, k, d))
+            self.delta.ops.append(("remove_node", n, G.nodes[n]))
+            G.remove_node(n)
+        return G
+
+    def keep_nodes(self, nodes):
+        keep = set(nodes)
+        return self.remove_nodes([ n for n in self.G if n not in keep ])
+
+    def set_node_attrs(self, node, values:dict):
+        attrs = self.G.nodes[node]
+        if all(k in attrs and attrs[k] == v for k, v in values.items()):
+            return
+        before = dict(attrs)
+        self.G.nodes[node].update(values)
+        self.delta.ops.append(("set_node", node, before, dict(self.G.nodes[node])))
+
+    def set_node_values(self, attr:str, values:dict):
+        nodes = self.G.nodes
+        after = { n: v for n, v in values.items() if n in nodes and (attr not in nodes[n] or nodes[n][attr] != v) }
+        if len(after) == 0:
+            return
+        before = { n: nodes[n][attr] for n in after if attr in nodes[n] }
+        missing = [ n for n in after if attr not in nodes[n] ]
+        for n, v in after.items():
+            nodes[n][attr] = v
+        self.delta.ops.append(("set_values", attr, before, missing, after))
+
+    # Same result as nx.compose(G, H), without copying G.
+    # With a diff of G against H, only what's new or different in H is copied.
+    def add_graph(self, H:nx.MultiDiGraph, diff:GraphDiff|None = None):
+        G = self.G
+        H = self.aliases.rewrite_graph(H)
+        nodes = H.nodes(data=True) if diff is None else [ (n, H.nodes[n]) for n in diff.new_nodes() if n in H ]
+        edges = H.edges(keys=True, data=True)
+        if diff is not None:
+            new_edges = diff.new_edges()
+            edges = [ (u, v, k, attrs) for u, v, k, attrs in edges if edge_id(u, v, k) in new_edges ]
+
+        added = []
+        for n, attrs in nodes:
+            if n in G:
+                self.set_node_attrs(n, attrs)
+            else:
+                G.add_node(n, **attrs)
+                added.append(n)
+        self.record_added(added, [])
+
+        endpoints, added = [], []
+        for u, v, k, attrs in edges:
+            if diff is not None and G.has_edge(u, v):
+                # the same link may be keyed 0 in one graph and "0" in the other
+                k = next((key for key in G[u][v] if str(key) == str(k)), k)
+            if G.has_edge(u, v, k):
+                link = G.edges[u, v, k]
+                if all(a in link and link[a] == value for a, value in attrs.items()):
+                    continue
+                before = dict(link)
+                link.update(attrs)
+                self.delta.ops.append(("set_edge", u, v, k, before, dict(link)))
+            else:
+                endpoints += [ n for n in dict.fromkeys([u, v]) if n not in G ]
+                added.append((u, v, G.add_edge(u, v, key=k, **attrs)))
+        self.record_added(endpoints, added)
+        return G
+
+    def add_edge(self, u, v, attrs:dict, key=None):
+        endpoints = [ n for n in dict.fromkeys([u, v]) if n not in self.G ]
+        k = self.G.add_edge(u, v, key=key, **attrs)
+        self.record_added(endpoints, [(u, v, k)])
+
+    def record_added(self, nodes:list, edges:list):
+        if nodes:
+            self.delta.ops.append(("add_nodes", nodes, []))
+        if edges:
+            self.delta.ops.append(("add_edges", edges, []))
+
+    # Starts an empty graph on a shared snapshot; later changes stay in this graph's overlay
+    def attach(self, snapshot:GraphSnapshot):
+        attach(self.G, snapshot)
+        self.delta.ops.append(("attach", snapshot))
+
+    # Ids the new aliases merge away that are already in the graph are combined into the node they now point at
+    def add_aliases(self, aliases:AliasIndex):
+        for keep, ids in aliases.members.items():
+            root, moved = self.aliases.union(keep, ids)
+            if not moved:
+                continue
+            self.delta.ops.append(("alias", root, moved))
+            present = [ i for _, group in moved for i in group if i in self.G ]
+            if not present:
+                continue
+            if root not in self.G:
+                self.G.add_node(root, **self.G.nodes[present[0]])
+                self.record_added([root], [])
+            self.combine_nodes(self.G, [root, *present])
+
+    # Same result as util.combine_nodes, without copying G for every merged node
+    def combine_nodes(self, G, nodes:list):
+        keep_node = nodes[0]
+        contraction = dict(self.G.nodes[keep_node].get("contraction", {}))
+        for n in nodes:
+            if n not in self.G.nodes or n == keep_node:
+                continue
+            out_edges = [ (keep_node if v == n else v, d) for _, v, d in self.G.out_edges(n, data=True) ]
+            in_edges = [ (u, d) for u, _, d in self.G.in_edges(n, data=True) if u != n ]
+            contraction[n] = dict(self.G.nodes[n])
+            self.remove_nodes([n])
+            for v, d in out_edges:
+                self.add_edge(keep_node, v, d)
+            for u, d in in_edges:
+                self.add_edge(u, keep_node, d)
+
+        root, moved = self.aliases.union(keep_node, nodes[1:])
+        if moved:
+            self.delta.ops.append(("alias", root, moved))
+
+        if keep_node in self.G:
+            values = {"alias_ids": nodes}
+            if contraction:
+                values["contraction"] = contraction
+            self.set_node_attrs(keep_node, values)
+        return self.G
+
+
+# Undo / redo by replaying compact deltas instead of keeping copies of the graph
+class History:
+
+    def __init__(self, G:nx.MultiDiGraph, max_size:int = 50):
+        self.G = G
+        self.aliases = AliasIndex()
+        self.max_size = max_size
+        self.undo_stack = []
+        self.redo_stack = []
+        # when set, every change is also appended here encoded, for saving elsewhere
+        self.journal = None
+        # when set, called before any edit, undo or redo, e.g. to bring back a graph spilled to disk
+        self.before_change = None
+        # changes whenever the graph's structure does, including undo and redo
+        self.version = 0
+
+    def can_undo(self) -> bool:
+        return len(self.undo_stack) > 0
+
+    def can_redo(self) -> bool:
+        return len(self.redo_stack) > 0
+
+    def prepare(self):
+        if self.before_change is not None:
+            self.before_change()
+
+    @contextmanager
+    def edit(self, label:str):
+        self.prepare()
+        edit = Edit(self.G, label, self.aliases)
+        try:
+            yield edit
+        finally:
+            if len(edit.delta) > 0:
+                self.push(edit.delta)
+
+    def push(self, delta:Delta):
+        self.version += 1
+        self.undo_stack.append(delta)
+        self.redo_stack = []
+        if len(self.undo_stack) > self.max_size:
+            self.undo_stack.pop(0)
+        self.record(delta.ops)
+
+    def record(self, ops:list, reverse:bool = False):
+        if self.journal is not None:
+            self.journal.append(encode_ops(self.G, ops, reverse))
+
+    def undo(self):
+        if not self.can_undo():
+            return None
+        self.prepare()
+        delta = self.undo_stack.pop()
+        self.version += 1
+        for op in reversed(delta.ops):
+            apply(self.G, self.aliases, op, reverse=True)
+        self.record(list(reversed(delta.ops)), reverse=True)
+        self.redo_stack.append(delta)
+        return delta
+
+    def redo(self):
+        if not self.can_redo():
+            return None
+        self.prepare()
+        delta = self.redo_stack.pop()
+        self.version += 1
+        for op in delta.ops:
+            apply(self.G, self.aliases, op)
+        self.record(delta.ops)
+        self.undo_stack.append(delta)
+        return delta
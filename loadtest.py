@@ -0,0 +1,142 @@
+import os
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import networkx as nx
+import pandas as pd
+from qng import GraphFactory, NodeFactory, LinkFactory, Element
+from history import History
+from sessions import SessionStore, SessionState
+from compute import ComputePool
+from parallel import parallel_graph
+from util import clean_columns, frame_columns, find_duplicates, tidy_graph, tidy_up
+
+
+# Simulated sessions doing what a user does after an upload: build, merge likely duplicates,
+# save the workspace, then reconnect to it from a fresh store (as another worker process would).
+# A heartbeat task measures how long the event loop is ever blocked while they run.
+
+FIRST = ["JOHN", "MARY", "ROBERT", "LINDA", "JAMES", "PATRICIA", "MICHAEL", "BARBARA"]
+LAST = ["SMITH", "JOHNSON", "WILLIAMS", "BROWN", "JONES", "GARCIA", "MILLER", "DAVIS"]
+STREETS = ["MAIN ST", "OAK AVE", "PINE RD", "MAPLE DR", "CEDAR LN"]
+
+
+def make_frame(rows:int, seed:int) -> pd.DataFrame:
+    rng = random.Random(seed)
+    return pd.DataFrame({
+        "agent": [ f"{rng.choice(FIRST)} {rng.choice('ABCDE')} {rng.choice(LAST)}" if rng.random() < 0.3 else f"{rng.choice(FIRST)} {rng.choice(LAST)}" for _ in range(rows) ],
+        "company": [ f"COMPANY {rng.randrange(rows // 3 + 1)} LLC" for _ in range(rows) ],
+        "address": [ f"{rng.randrange(1, 200)} {rng.choice(STREETS)}" for _ in range(rows) ],
+    }).pipe(clean_columns)
+
+
+graph_factory = GraphFactory(
+    node_factories = [
+        NodeFactory(id_field="agent", type=Element(type="static", value="agent"), tidy="name"),
+        NodeFactory(id_field="company", type=Element(type="static", value="company")),
+        NodeFactory(id_field="address", type=Element(type="static", value="address"), tidy="address"),
+    ],
+    link_factories = [
+        LinkFactory(source_field="agent", target_field="company", type=Element(type="static", value="agent of")),
+        LinkFactory(source_field="company", target_field="address", type=Element(type="static", value="located at")),
+    ]
+)
+
+
+async def session(n:int, rows:int, pool:ComputePool, folder:str) -> dict:
+    timings = {}
+    start = time.monotonic()
+    frame = make_frame(rows, seed=n)
+    G = nx.MultiDiGraph()
+    history = History(G)
+
+    H = await pool.run(graph_factory.graph_from_columns, frame_columns(frame), f"session_{n}.csv", aliases=history.aliases)
+    timings["build"] = time.monotonic() - start
+
+    duplicates = await pool.run(find_duplicates, tidy_graph(H), True)
+    with history.edit("build graph") as edit:
+        edit.add_graph(H)
+        tidy_up(G, combine=edit.combine_nodes, duplicates=duplicates)
+    timings["tidy"] = time.monotonic() - start - timings["build"]
+
+    workspace = f"loadtest{n:06d}"
+    store = SessionStore(folder)
+    store.save_state(workspace, SessionState(node_factories={ nf.id_field: nf for nf in graph_factory.node_factories }, link_factories=graph_factory.link_factories, aliases=history.aliases))
+    store.save_graph(workspace, G, history.aliases)
+    store.save_frame(workspace, frame)
+
+    reconnect = time.monotonic()
+    restored = nx.MultiDiGraph()
+    SessionStore(folder).load_graph(workspace, restored)
+    timings["restore"] = time.monotonic() - reconnect
+    timings["total"] = time.monotonic() - start
+    timings["ok"] = nx.utils.graphs_equal(G, restored)
+    timings["nodes"] = len(G)
+    return timings
+
+
+async def heartbeat(interval:float, stalls:list):
+    while True:
+        before = time.monotonic()
+        await asyncio.sleep(interval)
+        stalls.append(time.monotonic() - before - interval)
+
+
+def percentile(values:list, p:float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+async def main(sessions:int, rows:int, workers:int):
+    pool = ComputePool(workers)
+    stalls = []
+    beat = asyncio.create_task(heartbeat(0.01, stalls))
+    with tempfile.TemporaryDirectory() as folder:
+        start = time.monotonic()
+        results = await asyncio.gather(*[ session(n, rows, pool, folder) for n in range(sessions) ])
+        elapsed = time.monotonic() - start
+    beat.cancel()
+    pool.shutdown()
+
+    print(f"{sessions} sessions x {rows} rows, {workers} compute workers: {elapsed:.2f}s")
+    for step in ["build", "tidy", "restore", "total"]:
+        values = [ r[step] for r in results ]
+        print(f"  {step:8} p50 {percentile(values, 0.5):.3f}s  p95 {percentile(values, 0.95):.3f}s  max {max(values):.3f}s")
+    print(f"  event loop stalls: p95 {percentile(stalls, 0.95) * 1000:.1f}ms  max {max(stalls) * 1000:.1f}ms")
+    print(f"  restored workspaces identical: {sum(r['ok'] for r in results)}/{sessions}")
+
+
+# Build time for one big file: the serial build against parallel_graph with more and more compute workers
+async def scaling(rows:int, workers:list[int]):
+    frame = make_frame(rows, seed=0)
+    start = time.monotonic()
+    G = graph_factory.graph_from_columns(frame_columns(frame), "scaling.csv")
+    serial = time.monotonic() - start
+    print(f"{rows} rows on {os.cpu_count()} cores, serial build: {serial:.2f}s")
+    for n in workers:
+        pool = ComputePool(n)
+        # workers are started before timing, as they are in the app by its first big build
+        await asyncio.gather(*[ pool.run(time.sleep, 0) for _ in range(n) ])
+        stalls = []
+        beat = asyncio.create_task(heartbeat(0.01, stalls))
+        start = time.monotonic()
+        H = await parallel_graph(graph_factory, frame, "scaling.csv", pool)
+        elapsed = time.monotonic() - start
+        beat.cancel()
+        pool.shutdown()
+        print(f"  {n:3} workers: {elapsed:.2f}s ({serial / elapsed:.2f}x)  event loop stalls max {max(stalls, default=0) * 1000:.0f}ms  same graph: {nx.utils.graphs_equal(G, H)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run many simulated sessions at once against the compute pool and session store")
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--scaling", type=int, nargs="*", help="instead, time one big build (--rows) with each of these numbers of workers")
+    args = parser.parse_args()
+    if args.scaling:
+        asyncio.run(scaling(args.rows, args.scaling))
+    else:
+        asyncio.run(main(args.sessions, args.rows, args.workers))
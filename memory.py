@@ -0,0 +1,223 @@
+import os
+import sys
+import time
+import asyncio
+import tempfile
+import itertools
+import msgspec
+import networkx as nx
+import pandas as pd
+from history import History, Delta, encode_graph, decode_graph
+from qng import AliasIndex
+from snapshot import is_attached, private_counts
+
+
+MB = 1024 * 1024
+
+# Rough per-element costs of a MultiDiGraph (adjacency dicts in both directions)
+# and of the same element serialized into a Sigma widget, before attributes
+NODE_OVERHEAD = 400
+EDGE_OVERHEAD = 350
+WIDGET_NODE = 250
+WIDGET_EDGE = 150
+SAMPLE_SIZE = 200
+
+
+def env_mb(name:str, default:int|None) -> int|None:
+    value = os.environ.get(name)
+    if value is None or value == "":
+        return default * MB if default is not None else None
+    return int(float(value) * MB)
+
+
+def attrs_size(attrs:dict) -> int:
+    return sys.getsizeof(attrs) + sum(sys.getsizeof(v) for v in attrs.values())
+
+
+def sampled_size(items, count:int) -> int:
+    sample = list(itertools.islice(items, SAMPLE_SIZE))
+    if len(sample) == 0:
+        return 0
+    return int(sum(attrs_size(a) for a in sample) / len(sample) * count)
+
+
+def estimate_graph(G:nx.MultiDiGraph) -> int:
+    # a shared snapshot is paid for once per server, so only count what this graph changed
+    nodes, edges = private_counts(G) if is_attached(G) else (G.number_of_nodes(), G.number_of_edges())
+    return (
+        nodes * NODE_OVERHEAD + sampled_size((d for _, d in G.nodes(data=True)), nodes) +
+        edges * EDGE_OVERHEAD + sampled_size((d for _, _, d in G.edges(data=True)), edges)
+    )
+
+
+def estimate_widget(G:nx.MultiDiGraph) -> int:
+    return G.number_of_nodes() * WIDGET_NODE + G.number_of_edges() * WIDGET_EDGE
+
+
+def estimate_frame(df:pd.DataFrame) -> int:
+    return int(df.memory_usage(deep=True).sum())
+
+
+# What a build will roughly add: one node per row per node factory and one edge per row per link factory
+def estimate_build(rows:int, node_factories:int, link_factories:int) -> int:
+    return rows * (node_factories * (NODE_OVERHEAD + WIDGET_NODE) + link_factories * (EDGE_OVERHEAD + WIDGET_EDGE))
+
+
+class Usage(msgspec.Struct):
+    frame : int = 0
+    graph : int = 0
+    widget : int = 0
+
+    def total(self) -> int:
+        return self.frame + self.graph + self.widget
+
+
+# What a spill file holds: the graph and the undo / redo steps that lead back from it
+class Spilled(msgspec.Struct):
+    graph : bytes
+    undo_stack : list[Delta] = []
+    redo_stack : list[Delta] = []
+
+
+def movable(stack:list) -> bool:
+    # snapshots are shared with other sessions and can't go to disk with the rest
+    return all(op[0] != "attach" for delta in stack for op in delta.ops)
+
+
+# One session's share of the worker's memory, and its graph's spill file while it's idle
+class SessionMemory:
+
+    def __init__(self, session_id:str, G:nx.MultiDiGraph, history:History|None = None):
+        self.session_id = session_id
+        self.G = G
+        self.history = history
+        self.usage = Usage()
+        self.last_active = time.time()
+        self.spill_path = None
+        # when set, called after a spill to drop what was built from the graph (widget, indexes),
+        # and after a restore to build it again
+        self.on_spill = None
+        self.on_restore = None
+
+    @property
+    def spilled(self) -> bool:
+        return self.spill_path is not None
+
+    def measure(self, frame:pd.DataFrame|None = None, graph:nx.MultiDiGraph|None = None):
+        if frame is not None:
+            self.usage.frame = estimate_frame(frame)
+        if graph is not None and not self.spilled:
+            self.usage.graph = estimate_graph(graph)
+            self.usage.widget = estimate_widget(graph)
+
+    def touch(self):
+        self.last_active = time.time()
+        self.restore()
+
+    def spill(self) -> int:
+        if self.spilled or len(self.G) == 0 or is_attached(self.G):
+            return 0
+        spilled = Spilled(graph=encode_graph(self.G, AliasIndex()))
+        if self.history is not None and movable(self.history.undo_stack) and movable(self.history.redo_stack):
+            spilled.undo_stack, spilled.redo_stack = self.history.undo_stack, self.history.redo_stack
+        fd, path = tempfile.mkstemp(prefix="qng_spill_", suffix=".bin")
+        with os.fdopen(fd, "wb") as f:
+            f.write(msgspec.msgpack.encode(spilled))
+        self.G.clear()
+        if spilled.undo_stack or spilled.redo_stack:
+            self.history.undo_stack, self.history.redo_stack = [], []
+        self.spill_path = path
+        freed = self.usage.graph + self.usage.widget
+        self.usage.graph = self.usage.widget = 0
+        if self.on_spill is not None:
+            self.on_spill()
+        return freed
+
+    def restore(self):
+        if not self.spilled:
+            return
+        with open(self.spill_path, "rb") as f:
+            spilled = msgspec.msgpack.decode(f.read(), type=Spilled)
+        decode_graph(spilled.graph, self.G)
+        if spilled.undo_stack or spilled.redo_stack:
+            self.history.undo_stack, self.history.redo_stack = spilled.undo_stack, spilled.redo_stack
+        os.remove(self.spill_path)
+        self.spill_path = None
+        self.usage.graph = estimate_graph(self.G)
+        self.usage.widget = estimate_widget(self.G)
+        if self.on_restore is not None:
+            self.on_restore()
+
+    def close(self):
+        if self.spilled:
+            os.remove(self.spill_path)
+            self.spill_path = None
+
+
+# Keeps track of every session in this worker process, enforces the memory budgets,
+# and spills the graphs of sessions nobody has touched in a while
+class MemoryGovernor:
+
+    def __init__(self, session_budget:int|None = None, total_budget:int|None = None, idle_after:float = 900):
+        self.session_budget = session_budget
+        self.total_budget = total_budget
+        self.idle_after = idle_after
+        self.sessions = {}
+        self.task = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            session_budget = env_mb("QNG_SESSION_MEMORY_MB", 2048),
+            total_budget = env_mb("QNG_TOTAL_MEMORY_MB", None),
+            idle_after = float(os.environ.get("QNG_IDLE_SPILL_MINUTES", 15)) * 60
+        )
+
+    def register(self, session_id:str, G:nx.MultiDiGraph, history:History|None = None) -> SessionMemory:
+        memory = SessionMemory(session_id, G, history)
+        self.sessions[session_id] = memory
+        return memory
+
+    def unregister(self, session_id:str):
+        memory = self.sessions.pop(session_id, None)
+        if memory:
+            memory.close()
+
+    def total(self) -> int:
+        return sum(m.usage.total() for m in self.sessions.values())
+
+    def spill_idle(self, needed:int = 0, exclude:str|None = None) -> int:
+        now = time.time()
+        freed = 0
+        idle_first = sorted(self.sessions.values(), key=lambda m: m.last_active)
+        for memory in idle_first:
+            if memory.session_id == exclude or memory.spilled:
+                continue
+            if now - memory.last_active >= self.idle_after or freed < needed:
+                freed += memory.spill()
+        return freed
+
+    # Returns why adding `extra` bytes to this session would go over budget, or None if it fits
+    def check(self, memory:SessionMemory, extra:int = 0) -> str|None:
+        if self.session_budget is not None and memory.usage.total() + extra > self.session_budget:
+            return f"This would need about {(memory.usage.total() + extra) // MB} MB, more than the {self.session_budget // MB} MB each session can use."
+
+        if self.total_budget is not None:
+            over = self.total() + extra - self.total_budget
+            if over > 0:
+                self.spill_idle(needed=over, exclude=memory.session_id)
+            if self.total() + extra > self.total_budget:
+                return "The server is busy with other large graphs right now. Try again later, or with a smaller file."
+        return None
+
+    async def run(self, interval:float = 60):
+        while True:
+            await asyncio.sleep(interval)
+            self.spill_idle()
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+
+governor = MemoryGovernor.from_env()
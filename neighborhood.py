@@ -0,0 +1,76 @@
+import msgspec
+import networkx as nx
+from itertools import chain
+
+
+class Frontier(msgspec.Struct):
+    hop : int = 0
+    distances : dict = {}
+    frontier : list = []
+    truncated : bool = False
+
+
+# Bounded k-hop neighborhoods, following links in both directions.
+# Expansions are cached per set of starting nodes, so asking for more hops picks up where the last search stopped.
+class Neighborhood:
+
+    def __init__(self, G:nx.MultiDiGraph, max_nodes:int|None = None, max_per_hop:int|None = None, max_degree:int|None = None):
+        self.G = G
+        self.max_nodes = max_nodes
+        self.max_per_hop = max_per_hop
+        self.max_degree = max_degree
+        self.cache = {}
+
+    def clear(self):
+        self.cache = {}
+
+    def neighbors(self, node):
+        if self.G.is_directed():
+            return chain(self.G.successors(node), self.G.predecessors(node))
+        return self.G.neighbors(node)
+
+    def is_hub(self, node) -> bool:
+        return self.max_degree is not None and self.G.degree(node) > self.max_degree
+
+    def full(self, distances:dict, next_frontier:list) -> bool:
+        return (self.max_per_hop is not None and len(next_frontier) >= self.max_per_hop) or \
+               (self.max_nodes is not None and len(distances) >= self.max_nodes)
+
+    def search(self, sources:list, hops:int|None = None) -> Frontier:
+        key = frozenset(s for s in sources if s in self.G)
+        state = self.cache.get(key)
+        if state is None:
+            state = Frontier(distances={s: 0 for s in key}, frontier=list(key))
+            self.cache[key] = state
+
+        distances = state.distances
+        # a truncated hop is missing nodes, so searching on from it would put their neighbors at the wrong hop
+        while state.frontier and not state.truncated and (hops is None or state.hop < hops):
+            if self.max_nodes is not None and len(distances) >= self.max_nodes:
+                state.truncated = True
+                break
+
+            state.hop += 1
+            next_frontier = []
+            for n in state.frontier:
+                # hubs are shown, but not searched through unless you started from one
+                if distances[n] > 0 and self.is_hub(n):
+                    continue
+                for m in self.neighbors(n):
+                    if m in distances:
+                        continue
+                    if self.full(distances, next_frontier):
+                        state.truncated = True
+                        break
+                    distances[m] = state.hop
+                    next_frontier.append(m)
+                if state.truncated:
+                    break
+            state.frontier = next_frontier
+        return state
+
+    def expand(self, sources:list, hops:int|None = None) -> set:
+        distances = self.search(sources, hops).distances
+        if hops is None:
+            return set(distances)
+        return { n for n, d in distances.items() if d <= hops }
@@ -0,0 +1,256 @@
+import gc
+import os
+import asyncio
+import msgspec
+import numpy as np
+import networkx as nx
+import pandas as pd
+import pyarrow as pa
+from contextlib import contextmanager
+from multiprocessing.shared_memory import SharedMemory
+from qng import GraphFactory, AliasIndex, Categorical
+from compute import ComputePool
+
+
+# Below this many rows, splitting the build up costs more than it saves
+PARALLEL_ROWS = int(os.environ.get("QNG_PARALLEL_ROWS", 200000))
+
+
+# The columns a build reads, written once as an Arrow stream into shared memory.
+# Workers map the same pages instead of each receiving a pickled copy of the table.
+def share_columns(df:pd.DataFrame) -> SharedMemory:
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sizer = pa.MockOutputStream()
+    with pa.ipc.new_stream(sizer, table.schema) as writer:
+        writer.write_table(table)
+    shm = SharedMemory(create=True, size=max(sizer.size(), 1))
+    with pa.ipc.new_stream(pa.FixedSizeBufferWriter(pa.py_buffer(shm.buf)), table.schema) as writer:
+        writer.write_table(table)
+    return shm
+
+
+# A row range's nodes and links as arrays. Ids are codes into the range's own table of
+# distinct ids (-1 where the row makes no node or link); everything else stays Categorical.
+class NodeColumns(msgspec.Struct):
+    ids : np.ndarray
+    labels : Categorical | None
+    type : Categorical
+    attr : dict[str, Categorical]
+    tidy : str | None
+    data_source : str
+
+    # the same attributes NodeBatch.nx_format gives the row; with no label column the label is the id
+    def row(self, r:int, node_id:str) -> dict:
+        return {
+            "label": node_id if self.labels is None else self.labels.get(r),
+            "type": self.type.get(r),
+            "data_source": self.data_source,
+            **{ a: values.get(r) for a, values in self.attr.items() },
+            "tidy": self.tidy
+        }
+
+
+class LinkColumns(msgspec.Struct):
+    sources : np.ndarray
+    targets : np.ndarray
+    type : Categorical
+    attr : dict[str, Categorical]
+
+    # Each distinct combination of type and attributes once, and which one each row has
+    def templates(self) -> tuple[list[dict], np.ndarray]:
+        parts = [self.type, *self.attr.values()]
+        codes = np.stack([ np.zeros(len(self.sources), dtype=np.int64) if c.codes is None else np.asarray(c.codes, dtype=np.int64) for c in parts ], axis=1)
+        combos, inverse = np.unique(codes, axis=0, return_inverse=True)
+        names = ["type", *self.attr]
+        return [ { name: c.values[i] for name, c, i in zip(names, parts, combo.tolist()) } for combo in combos ], inverse.reshape(-1)
+
+
+class RangeColumns(msgspec.Struct):
+    ids : list
+    nodes : list[NodeColumns]
+    links : list[LinkColumns]
+
+
+def compact_batches(node_batches:list, link_batches:list) -> RangeColumns:
+    keys = [ nb.ids for nb in node_batches ] + [ lb.sources for lb in link_batches ] + [ lb.targets for lb in link_batches ]
+    codes, ids = pd.factorize(np.array([ k for column in keys for k in column ], dtype=object))
+    columns, start = [], 0
+    for column in keys:
+        columns.append(codes[start:start + len(column)])
+        start += len(column)
+    nodes = []
+    for nb, ids_codes in zip(node_batches, columns):
+        nodes.append(NodeColumns(
+            ids = np.where(np.asarray(nb.blank, dtype=bool), -1, ids_codes) if nb.blank else ids_codes,
+            labels = None if nb.labels is nb.ids else Categorical.encode(nb.labels),
+            type = nb.type, attr = nb.attr, tidy = nb.tidy, data_source = nb.data_source
+        ))
+    links = []
+    for lb, sources, targets in zip(link_batches, columns[len(node_batches):], columns[len(node_batches) + len(link_batches):]):
+        blank = np.asarray(lb.blank, dtype=bool) if lb.blank else np.zeros(len(lb), dtype=bool)
+        links.append(LinkColumns(sources = np.where(blank, -1, sources), targets = np.where(blank, -1, targets), type = lb.type, attr = lb.attr))
+    return RangeColumns(ids=list(ids), nodes=nodes, links=links)
+
+
+# Runs in a worker: the factories over rows [start, stop), read without copying from shared memory
+def build_range(name:str, start:int, stop:int, gf:GraphFactory, data_source:str, aliases:AliasIndex|None = None) -> RangeColumns:
+    shm = SharedMemory(name=name)
+    try:
+        part = pa.ipc.open_stream(pa.py_buffer(shm.buf)).read_all().slice(start, stop - start)
+        columns = { c: part.column(c).to_pandas() for c in part.column_names }
+        batches = gf.make_batches(columns, data_source, aliases)
+        # the batches hold their own copies; nothing may point into the buffer once it's closed
+        del part, columns
+    finally:
+        shm.close()
+    return compact_batches(*batches)
+
+
+# Building millions of small dicts sets off the cycle collector over and over, and none of them can form a cycle
+@contextmanager
+def gc_paused():
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+# The graph G.add_nodes_from and G.add_edges_from would make from the ranges' rows in order, built
+# straight into its dicts: each node's attributes are merged once from the last row of each factory
+# that made it, and each pair's links are added together with their keys worked out up front.
+def merge_ranges(parts:list[RangeColumns], skip:dict|None = None) -> nx.MultiDiGraph:
+    G = nx.MultiDiGraph()
+    if len(parts) == 0:
+        return G
+    codes, names = pd.factorize(np.concatenate([ np.array(p.ids, dtype=object) for p in parts ]))
+    names = names.tolist()
+    remaps, offset = [], 0
+    for p in parts:
+        remaps.append(np.append(codes[offset:offset + len(p.ids)], -1))
+        offset += len(p.ids)
+    skipped = np.array([ n in skip for n in names ], dtype=bool) if skip else np.zeros(len(names), dtype=bool)
+
+    # nodes: one entry per row and factory, at the position interleave would give it
+    node_factories = len(parts[0].nodes)
+    entries, row = [], 0
+    for p, part in enumerate(parts):
+        for f, nc in enumerate(part.nodes):
+            ids = remaps[p][nc.ids]
+            r = np.flatnonzero((ids >= 0) & ~skipped[np.maximum(ids, 0)])
+            entries.append(np.stack([ ids[r], (row + r) * node_factories + f, np.full(len(r), f), np.full(len(r), p), r ], axis=1))
+        row += len(part.nodes[0].ids) if part.nodes else 0
+    entries = np.concatenate(entries) if entries else np.zeros((0, 5), dtype=np.int64)
+    entries = entries[np.argsort(entries[:, 1], kind="stable")]
+    node_codes, first = np.unique(entries[:, 0], return_index=True)
+    rank = np.zeros(len(names), dtype=np.int64)
+    rank[node_codes] = np.argsort(np.argsort(first))
+    # the last row of each factory per node is all that survives its updates
+    key = entries[:, 0] * max(node_factories, 1) + entries[:, 2]
+    _, last = np.unique(key[::-1], return_index=True)
+    last = entries[len(entries) - 1 - last]
+    last = last[np.lexsort((last[:, 1], rank[last[:, 0]]))]
+
+    nodes, succ, pred = G._node, G._succ, G._pred
+    with gc_paused():
+        for c, _, f, p, r in last.tolist():
+            n = names[c]
+            attrs = nodes.get(n)
+            if attrs is None:
+                attrs = nodes[n] = {}
+                succ[n] = {}
+                pred[n] = {}
+            attrs.update(parts[p].nodes[f].row(r, n))
+
+    # links, in the order interleave would give them
+    link_factories = len(parts[0].links)
+    sources, targets, positions, template_ids, templates, row = [], [], [], [], [], 0
+    for p, part in enumerate(parts):
+        for l, lc in enumerate(part.links):
+            u, v = remaps[p][lc.sources], remaps[p][lc.targets]
+            r = np.flatnonzero((u >= 0) & (v >= 0))
+            combos, inverse = lc.templates()
+            sources.append(u[r])
+            targets.append(v[r])
+            positions.append((row + r) * link_factories + l)
+            template_ids.append(inverse[r] + len(templates))
+            templates += combos
+        row += len(part.links[0].sources) if part.links else 0
+    if link_factories == 0:
+        return G
+    order = np.argsort(np.concatenate(positions), kind="stable")
+    u, v, t = [ np.concatenate(a)[order] for a in [sources, targets, template_ids] ]
+
+    # ends that no factory made a node for are added as they first appear
+    ends = np.empty(2 * len(u), dtype=np.int64)
+    ends[0::2], ends[1::2] = u, v
+    is_node = np.zeros(len(names), dtype=bool)
+    is_node[node_codes] = True
+    ends = ends[~is_node[ends]]
+    new, first_end = np.unique(ends, return_index=True)
+    for c in new[np.argsort(first_end)].tolist():
+        n = names[c]
+        nodes[n] = {}
+        succ[n] = {}
+        pred[n] = {}
+
+    # keys count up from 0 per pair, in row order, with pairs added as they first appear
+    pairs, first_pair, inverse = np.unique(u * len(names) + v, return_index=True, return_inverse=True)
+    pair_rank = np.empty(len(pairs), dtype=np.int64)
+    pair_rank[np.argsort(first_pair)] = np.arange(len(pairs))
+    group = pair_rank[inverse.reshape(-1)]
+    by_pair = np.argsort(group, kind="stable")
+    bounds = np.zeros(len(pairs) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(group, minlength=len(pairs)), out=bounds[1:])
+    heads = by_pair[bounds[:-1]]
+    t = t[by_pair].tolist()
+    with gc_paused():
+        for start, stop, a, b in zip(bounds[:-1].tolist(), bounds[1:].tolist(), u[heads].tolist(), v[heads].tolist()):
+            keydict = { k: templates[i].copy() for k, i in enumerate(t[start:stop]) }
+            succ[names[a]][names[b]] = keydict
+            pred[names[b]][names[a]] = keydict
+    return G
+
+
+# Runs in a worker: fn(df, *args) with df read from the columns in shared memory
+def run_on_columns(name:str, fn, *args):
+    shm = SharedMemory(name=name)
+    try:
+        table = pa.ipc.open_stream(pa.py_buffer(shm.buf)).read_all()
+        df = pd.DataFrame({ c: table.column(c).to_pandas() for c in table.column_names })
+        result = fn(df, *args)
+        del table, df
+    finally:
+        shm.close()
+    return result
+
+
+async def run_shared(pool:ComputePool, df:pd.DataFrame, fn, *args):
+    shm = share_columns(df)
+    try:
+        return await pool.run(run_on_columns, shm.name, fn, *args)
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def row_ranges(rows:int, parts:int) -> list[tuple[int, int]]:
+    size = -(-rows // max(parts, 1))
+    return [ (start, min(start + size, rows)) for start in range(0, rows, max(size, 1)) ]
+
+
+# Same graph as gf.graph_from_columns, with the factories run on row ranges across the compute pool.
+# Ranges are merged in row order, so ids seen in several ranges are deduplicated exactly as one build would.
+async def parallel_graph(gf:GraphFactory, df:pd.DataFrame, data_source:str, pool:ComputePool, aliases:AliasIndex|None = None) -> nx.MultiDiGraph:
+    shm = share_columns(df[gf.fields()])
+    try:
+        futures = [ pool.submit(build_range, shm.name, start, stop, gf, data_source, aliases) for start, stop in row_ranges(len(df), pool.workers) ]
+        parts = [ await asyncio.wrap_future(f) for f in futures ]
+    finally:
+        shm.close()
+        shm.unlink()
+
+    # the merge is one pass over arrays and dicts, kept off the event loop
+    return await asyncio.to_thread(merge_ranges, parts, aliases.canonical if aliases else None)
@@ -0,0 +1,102 @@
+import time
+import networkx as nx
+
+
+# Yielded by the search every so many steps, so the caller can check the clock even when no path turns up for a long time
+PAUSE = object()
+STEPS_PER_PAUSE = 1000
+
+
+# Simple paths between two nodes, shortest first, within a length cutoff, a path count and a time budget.
+# A breadth-first search back from the target gives every node's distance to it, so the
+# depth-first search forward from the source never steps onto a node that can't reach the
+# target in the links it has left.
+class PathSearch:
+
+    def __init__(self, G:nx.MultiDiGraph, source, target, cutoff:int|None = None, max_paths:int|None = None, time_budget:float|None = None, exclude:set = set()):
+        graph = G.to_undirected(as_view=True)
+        if exclude:
+            graph = nx.subgraph_view(graph, filter_node=lambda n: n not in exclude or n in [source, target])
+        self.graph = graph
+        self.source = source
+        self.target = target
+        self.max_paths = max_paths
+        self.deadline = time.monotonic() + time_budget if time_budget else None
+
+        self.to_target = nx.single_source_shortest_path_length(graph, target, cutoff=cutoff) if target in graph else {}
+        self.shortest = self.to_target.get(source)
+        # with no cutoff, only the shortest paths
+        self.cutoff = self.shortest if cutoff is None else cutoff
+
+        self.count = 0
+        self.nodes = set()
+        self.stopped = None
+        self.iterator = self.paths()
+
+    @property
+    def done(self) -> bool:
+        return self.stopped is not None
+
+    def paths(self):
+        if self.shortest is None:
+            return
+        for length in range(self.shortest, self.cutoff + 1):
+            yield from self.paths_of_length(length)
+
+    def paths_of_length(self, length:int):
+        source, target, to_target = self.source, self.target, self.to_target
+        if source == target:
+            if length == 0:
+                yield [source]
+            return
+
+        path = [source]
+        on_path = {source}
+        stack = [iter(self.graph.neighbors(source))]
+        steps = 0
+        while stack:
+            steps += 1
+            if steps % STEPS_PER_PAUSE == 0:
+                yield PAUSE
+            for m in stack[-1]:
+                if m in on_path:
+                    continue
+                d = to_target.get(m)
+                if d is None or len(path) + d > length:
+                    continue
+                if m == target:
+                    if len(path) == length:
+                        yield path + [m]
+                    continue
+                path.append(m)
+                on_path.add(m)
+                stack.append(iter(self.graph.neighbors(m)))
+                break
+            else:
+                stack.pop()
+                on_path.discard(path.pop())
+
+    # Paths found in the next few milliseconds, so results can be shown while the search goes on
+    def next_batch(self, seconds:float = 0.1) -> list:
+        batch = []
+        batch_end = time.monotonic() + seconds
+        while not self.done:
+            if self.max_paths is not None and self.count >= self.max_paths:
+                self.stopped = "max_paths"
+                break
+            now = time.monotonic()
+            if self.deadline is not None and now >= self.deadline:
+                self.stopped = "time"
+                break
+            if now >= batch_end:
+                break
+            path = next(self.iterator, None)
+            if path is None:
+                self.stopped = "complete"
+                break
+            if path is PAUSE:
+                continue
+            batch.append(path)
+            self.count += 1
+            self.nodes.update(path)
+        return batch
@@ -0,0 +1,135 @@
+import msgspec
+import numpy as np
+import pandas as pd
+from qng import GraphFactory, is_null
+
+
+# Distinct counts in a few KB, to within about 1% (p=14), however many values go through it
+class HyperLogLog:
+
+    def __init__(self, p:int = 14):
+        self.p = p
+        self.registers = np.zeros(1 << p, dtype=np.uint8)
+
+    def add(self, hashes:np.ndarray):
+        if len(hashes) == 0:
+            return
+        index = (hashes >> np.uint64(64 - self.p)).astype(np.int64)
+        rest = ((hashes << np.uint64(self.p)) >> np.uint64(32)).astype(np.float64)
+        # position of the first 1 bit in what's left of the hash
+        rank = np.where(rest > 0, 32 - np.floor(np.log2(np.maximum(rest, 1))), 33).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other:"HyperLogLog"):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self) -> int:
+        m = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        zeros = np.count_nonzero(self.registers == 0)
+        if estimate <= 2.5 * m and zeros > 0:
+            estimate = m * np.log(m / zeros)
+        return int(round(estimate))
+
+
+# Counts per value that are never too low, and too high by at most about e * total / width
+class CountMinSketch:
+
+    SEEDS = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0xD6E8FEB86659FD93], dtype=np.uint64)
+
+    def __init__(self, width_bits:int = 16):
+        self.width_bits = width_bits
+        self.table = np.zeros((len(self.SEEDS), 1 << width_bits), dtype=np.int64)
+
+    def columns(self, hashes:np.ndarray):
+        with np.errstate(over="ignore"):
+            return [ ((hashes * seed) >> np.uint64(64 - self.width_bits)).astype(np.int64) for seed in self.SEEDS ]
+
+    def add(self, hashes:np.ndarray):
+        for row, index in zip(self.table, self.columns(hashes)):
+            row += np.bincount(index, minlength=len(row))
+
+    def query(self, hashes:np.ndarray) -> np.ndarray:
+        if len(hashes) == 0:
+            return np.zeros(0, dtype=np.int64)
+        return np.min([ row[index] for row, index in zip(self.table, self.columns(hashes)) ], axis=0)
+
+
+# A hash of each value's id string, plus which are blank, working out each distinct value once
+def key_hashes(values) -> tuple[np.ndarray, np.ndarray]:
+    codes, uniques = pd.factorize(values)
+    text = [ str(v) for v in uniques ]
+    # missing values get code -1, which picks the blank entry at the end
+    blank = np.array([ is_null(t) for t in text ] + [True], dtype=bool)
+    hashes = np.append(pd.util.hash_array(np.array(text, dtype=object)), np.uint64(0))
+    return hashes[codes], blank[codes]
+
+
+class Projection(msgspec.Struct):
+    rows : int
+    nodes : int
+    links : int
+    hubs : int
+    hub_threshold : int
+    ids : dict[str, int] = {}
+
+
+# What a full build would make, from one pass over the key columns a chunk at a time:
+# distinct ids (overall and per node column), links, and nodes with more than hub_threshold links.
+# Merges from the alias index and tidying aren't counted, so nodes are an upper estimate.
+def project_graph(df:pd.DataFrame, gf:GraphFactory, hub_threshold:int, chunk_size:int = 200000) -> Projection:
+    id_sketches = { nf.id_field: HyperLogLog() for nf in gf.node_factories }
+    all_ids = HyperLogLog()
+    degrees = CountMinSketch()
+    candidates = set()
+    links = 0
+
+    for start in range(0, len(df), chunk_size):
+        chunk = df.iloc[start:start + chunk_size]
+        keys = { f: key_hashes(chunk[f] if f in chunk else [None] * len(chunk)) for f in gf.key_fields() }
+
+        for nf in gf.node_factories:
+            hashes, blank = keys[nf.id_field]
+            id_sketches[nf.id_field].add(hashes[~blank])
+
+        endpoints = []
+        for lf in gf.link_factories:
+            (sources, blank_sources), (targets, blank_targets) = keys[lf.source_field], keys[lf.target_field]
+            keep = ~(blank_sources | blank_targets)
+            links += int(keep.sum())
+            endpoints += [ sources[keep], targets[keep] ]
+        if len(endpoints) == 0:
+            continue
+        endpoints = np.concatenate(endpoints)
+        all_ids.add(endpoints)
+        degrees.add(endpoints)
+        # anything over the threshold so far stays a candidate; the sketch never undercounts, so no hub is missed
+        seen = np.unique(endpoints)
+        candidates.update(seen[degrees.query(seen) > hub_threshold].tolist())
+
+    for sketch in id_sketches.values():
+        all_ids.merge(sketch)
+    candidates = np.array(sorted(candidates), dtype=np.uint64)
+    return Projection(
+        rows = len(df),
+        nodes = all_ids.count(),
+        links = links,
+        hubs = int(np.count_nonzero(degrees.query(candidates) > hub_threshold)),
+        hub_threshold = hub_threshold,
+        ids = { field: sketch.count() for field, sketch in id_sketches.items() }
+    )
+
+
+# A random sample of rows, or with stratify, the same share of every value of that column (at least one row each),
+# so rare link or node types still show up in the preview
+def sample_frame(df:pd.DataFrame, rows:int, stratify:str|None = None, seed:int = 0) -> pd.DataFrame:
+    if len(df) <= rows:
+        return df
+    if not stratify or stratify not in df or df[stratify].nunique(dropna=False) > rows:
+        return df.sample(n=rows, random_state=seed).sort_index()
+
+    rate = rows / len(df)
+    groups = df[stratify].astype(str)
+    order = pd.Series(np.random.default_rng(seed).random(len(df)), index=df.index).groupby(groups).rank(method="first")
+    quota = groups.map(groups.value_counts()).mul(rate).round().clip(lower=1)
+    return df[(order <= quota).to_numpy()]
@@ -1,8 +1,85 @@
-import io 
+import zlib
 import msgspec
 from ipysigma import Sigma
+from ipywidgets.embed import dependency_state, embed_snippet, escape_script, html_template
 import networkx as nx 
-from typing import Optional
+import pandas as pd
+from typing import Iterable, Optional
+from array import array
+from datetime import datetime
+from itertools import repeat, islice
+
+
+GRAPH_DATA = "__qng_graph_data__"
+GRAPH_LAYOUT = "__qng_graph_layout__"
+
+
+# Only one chunk of items is ever built at a time
+def encode_items(items:Iterable, chunk_size:int):
+    items = iter(items)
+    first = True
+    while len(chunk := list(islice(items, chunk_size))) > 0:
+        yield ("" if first else ",") + escape_script(msgspec.json.encode(chunk)[1:-1].decode())
+        first = False
+
+
+# Nodes are renamed to their short ids; the original id shows as the label, or as "id" if there's a label already
+def compact_node(n:dict, ids:dict) -> dict:
+    attrs = n["attributes"]
+    original = {"id": n["key"]} if "label" in attrs else {"label": n["key"]}
+    return {"key": ids[n["key"]], "attributes": {**original, **attrs}}
+
+
+def compact_graph_data(data:dict, ids:dict, chunk_size:int):
+    yield '{"nodes":['
+    yield from encode_items(( compact_node(n, ids) for n in data["nodes"] ), chunk_size)
+    yield '],"edges":['
+    yield from encode_items(( {**e, "source": ids[e["source"]], "target": ids[e["target"]]} for e in data["edges"] ), chunk_size)
+    yield '],"options":' + msgspec.json.encode(data["options"]).decode() + '}'
+
+
+def compact_layout(layout:dict|None, ids:dict, chunk_size:int):
+    if not layout:
+        yield "null"
+        return 
+    positions = [ (ids[n], round(p["x"], 2), round(p["y"], 2)) for n, p in layout.items() if n in ids ]
+    yield "{"
+    for i in range(0, len(positions), chunk_size):
+        chunk = ",".join(f'"{n}":{{"x":{x},"y":{y}}}' for n, x, y in positions[i:i + chunk_size])
+        yield ("," if i > 0 else "") + chunk
+    yield "}"
+
+
+# Writes the same page as Sigma.write_html one piece at a time, with nodes renamed to short numeric ids
+def html_chunks(sigma:Sigma, chunk_size:int = 5000):
+    state = dependency_state([sigma])
+    widget = state[sigma.model_id]["state"]
+    data, layout = widget["data"], widget.get("layout")
+    ids = { n["key"]: i for i, n in enumerate(data["nodes"]) }
+    widget["data"], widget["layout"] = GRAPH_DATA, GRAPH_LAYOUT
+    if widget.get("selected_node") in ids:
+        widget["selected_node"] = ids[widget["selected_node"]]
+    
+    page = html_template.format(title="Quick Network Graph", snippet=embed_snippet([sigma], state=state, indent=None))
+    before_data, rest = page.split(f'"{GRAPH_DATA}"')
+    before_layout, after_layout = rest.split(f'"{GRAPH_LAYOUT}"')
+    
+    yield before_data.encode()
+    for chunk in compact_graph_data(data, ids, chunk_size):
+        yield chunk.encode()
+    yield before_layout.encode()
+    for chunk in compact_layout(layout, ids, chunk_size):
+        yield chunk.encode()
+    yield after_layout.encode()
+
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(wbits=31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
 
     
 class Element(msgspec.Struct):
@@ -10,17 +87,225 @@ class Element(msgspec.Struct):
     value : str 
 
 
-class Node(msgspec.Struct):
-    id : str 
-    label : str 
-    type : str 
-    data_source : str = "il_sos"
-    attr : dict = {}
+def is_missing(value) -> bool:
+    return value is None or value is pd.NA or value is pd.NaT or (isinstance(value, float) and value != value)
+
+
+# Repeated values are stored once, with a compact array of codes pointing at them
+class Categorical(msgspec.Struct):
+    values : list
+    codes : array | None = None
+    
+    @classmethod
+    def encode(cls, column:list):
+        # pandas categorical columns are already encoded this way; missing values (code -1) map to None
+        if str(getattr(column, "dtype", "")) == "category":
+            values = [ *column.cat.categories, None ]
+            return cls(values=values, codes=column.cat.codes.to_numpy().astype("int64") % len(values))
+        lookup = {}
+        codes = array('L', [ lookup.setdefault(v, len(lookup)) for v in column ])
+        # blank cells in Arrow string columns are pd.NA, which nothing downstream can encode
+        return cls(values=[ None if is_missing(v) else v for v in lookup ], codes=codes)
+    
+    @classmethod
+    def constant(cls, value):
+        return cls(values=[value])
+    
+    def map(self, f):
+        return Categorical(values=[ f(v) for v in self.values ], codes=self.codes)
+    
+    def get(self, i:int):
+        return self.values[self.codes[i]] if self.codes is not None else self.values[0]
     
+    def __iter__(self):
+        if self.codes is None:
+            return repeat(self.values[0])
+        return ( self.values[c] for c in self.codes )
+    
+    def to_list(self) -> list:
+        return [ self.values[c] for c in self.codes ]
+
+
+# Maps every id that has been merged away to the node it was merged into.
+# Each alias points straight at its canonical id, so lookups are a single dict get.
+class AliasIndex(msgspec.Struct):
+    canonical : dict[str, str] = {}
+    members : dict[str, list[str]] = {}
+    
+    @classmethod
+    def from_mapping(cls, mapping:dict):
+        index = cls()
+        for alias, keep in mapping.items():
+            index.union(keep, [alias])
+        return index
+    
+    def __len__(self):
+        return len(self.canonical)
+    
+    def find(self, node):
+        return self.canonical.get(node, node)
+    
+    def resolve(self, nodes:list) -> list:
+        get = self.canonical.get
+        return [ get(n, n) for n in nodes ]
+    
+    def union(self, keep, others:list):
+        root = self.find(keep)
+        moved = []
+        for other in others:
+            other_root = self.find(other)
+            if other_root == root:
+                continue
+            ids = [other_root, *self.members.pop(other_root, [])]
+            for i in ids:
+                self.canonical[i] = root
+            self.members.setdefault(root, []).extend(ids)
+            moved.append((other_root, ids))
+        return root, moved
+    
+    # Reverses a union, for undo
+    def split(self, root, moved:list):
+        for other_root, ids in reversed(moved):
+            removed = set(ids)
+            self.members[root] = [ m for m in self.members.get(root, []) if m not in removed ]
+            if len(self.members[root]) == 0:
+                del self.members[root]
+            for i in ids:
+                self.canonical.pop(i, None)
+            for i in ids[1:]:
+                self.canonical[i] = other_root
+            if len(ids) > 1:
+                self.members[other_root] = ids[1:]
+    
+    # Moves nodes and links that use merged-away ids onto the nodes they were merged into
+    def rewrite_graph(self, G:nx.MultiDiGraph) -> nx.MultiDiGraph:
+        if not any(n in self.canonical for n in G):
+            return G
+        H = nx.MultiDiGraph()
+        H.add_nodes_from( (n, attrs) for n, attrs in G.nodes(data=True) if n not in self.canonical )
+        get = self.canonical.get
+        H.add_edges_from( (get(u, u), get(v, v), attrs) for u, v, attrs in G.edges(data=True) )
+        return H
+
+
+class NodeBatch(msgspec.Struct):
+    ids : list[str]
+    labels : list[str]
+    type : Categorical
+    attr : dict[str, Categorical] = {}
+    tidy : str | None = None
+    data_source : str = ""
+    blank : list[bool] = []
+    
+    def __len__(self):
+        return len(self.ids)
+    
+    # Rows with a blank id come out as None, so batches stay lined up row by row
     def nx_format(self):
-        return (self.id, {"label": self.label, "type": self.type, "data_source": self.data_source, **self.attr})
+        attr_names = list(self.attr)
+        attr_values = [ iter(self.attr[a]) for a in attr_names ]
+        blank = self.blank or repeat(False)
+        for node_id, label, node_type, is_blank in zip(self.ids, self.labels, self.type, blank):
+            values = [ next(v) for v in attr_values ]
+            if is_blank:
+                yield None
+                continue
+            yield (node_id, {
+                "label": label, 
+                "type": node_type, 
+                "data_source": self.data_source, 
+                **dict(zip(attr_names, values)), 
+                "tidy": self.tidy
+            })
+
+
+class LinkBatch(msgspec.Struct):
+    sources : list[str]
+    targets : list[str]
+    type : Categorical
+    attr : dict[str, Categorical] = {}
+    blank : list[bool] = []
+    
+    def __len__(self):
+        return len(self.sources)
+    
+    def resolve(self, aliases:AliasIndex):
+        return LinkBatch(
+            sources = aliases.resolve(self.sources), 
+            targets = aliases.resolve(self.targets), 
+            type = self.type, 
+            attr = self.attr,
+            blank = self.blank
+        )
+    
+    def nx_format(self):
+        attr_names = list(self.attr)
+        attr_values = [ iter(self.attr[a]) for a in attr_names ]
+        blank = self.blank or repeat(False)
+        for source, target, link_type, is_blank in zip(self.sources, self.targets, self.type, blank):
+            values = [ next(v) for v in attr_values ]
+            if is_blank:
+                yield None
+                continue
+            yield (source, target, {"type": link_type, **dict(zip(attr_names, values))})
+
+
+# What astype('str') makes of missing values. Words people type for blanks ("NA", "null") are left alone,
+# since they can just as well be ids (a country code, a ticker).
+NULL_VALUES = {"", "none", "nan", "nat", "<na>"}
+
+
+def is_null(value) -> bool:
+    return value is None or str(value).strip().lower() in NULL_VALUES
+
+
+DATE_FORMATS = ["%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%m/%d/%Y %H:%M", "%d-%b-%Y", "%b %d, %Y"]
+
+
+# Dates in any of the common formats become ISO dates (2019-05-01), so they sort and compare as dates
+def as_date(value):
+    if not isinstance(value, str) or len(value) > 25 or not any(c.isdigit() for c in value):
+        return value
+    text = value.strip()
+    for f in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, f).date().isoformat()
+        except ValueError:
+            continue
+    return value
+
+
+# Checks each distinct value once
+def null_mask(values:list) -> list[bool]:
+    return Categorical.encode(values).map(is_null).to_list()
+
+
+# Ids as strings, plus which of them are blank, converting each distinct value once
+def key_strings(values:list) -> tuple[list[str], list[bool]]:
+    encoded = Categorical.encode(values)
+    return encoded.map(str).to_list(), encoded.map(is_null).to_list()
+
+
+def column(columns:dict, field:str|None, length:int) -> list:
+    values = columns.get(field)
+    return values if values is not None else [None] * length
+
+
+def columns_length(columns:dict) -> int:
+    return max([ len(c) for c in columns.values() ], default=0)
+
+
+# Row by row, the same order the factories would make them one record at a time
+def interleave(batches:list, skip:dict|None = None):
+    for row in zip(*[ b.nx_format() for b in batches ]):
+        yield from ( r for r in row if r is not None and not (skip and r[0] in skip) )
+
+
+def records_to_columns(records:list) -> dict:
+    fields = list(dict.fromkeys(f for r in records for f in r))
+    return { f: [ r.get(f) for r in records ] for f in fields }
+
 
-        
 class NodeFactory(msgspec.Struct, kw_only=True):
     id_field : str
     label_field : Optional[str | None] = None
@@ -28,13 +313,18 @@ class NodeFactory(msgspec.Struct, kw_only=True):
     attr : list[str] = []
     tidy : Optional[str|None] = None
     
-    def make_node(self, data:dict, data_source:str = ""):
-        return Node(**{
-            "id": str(data.get(self.id_field)),
-            "label": str(data.get(self.label_field)) if self.label_field else str(data.get(self.id_field)),
-            "type": data.get(self.type.value) if self.type.type == "field" else self.type.value,
-            "attr": {**{a: data.get(a, None) for a in self.attr}, "tidy": self.tidy, "data_source": data_source}
-        })
+    def make_batch(self, columns:dict, data_source:str = "") -> NodeBatch:
+        length = columns_length(columns)
+        ids, blank = key_strings(column(columns, self.id_field, length))
+        return NodeBatch(
+            ids = ids, 
+            labels = Categorical.encode(column(columns, self.label_field, length)).map(str).to_list() if self.label_field else ids,
+            type = Categorical.encode(column(columns, self.type.value, length)) if self.type.type == "field" else Categorical.constant(self.type.value),
+            attr = { a: Categorical.encode(column(columns, a, length)).map(as_date) for a in self.attr },
+            tidy = self.tidy,
+            data_source = data_source,
+            blank = blank
+        )
         
     def to_dict(self):
         return {
@@ -45,16 +335,6 @@ class NodeFactory(msgspec.Struct, kw_only=True):
         }
 
 
-class Link(msgspec.Struct):
-    source : str 
-    target : str 
-    type : str 
-    attr : dict = {}
-    
-    def nx_format(self) -> tuple:
-        return (str(self.source), str(self.target), {"type": self.type, **self.attr})
-
-    
 class LinkFactory(msgspec.Struct):
     source_field : str 
     target_field: str 
@@ -75,16 +355,21 @@ class LinkFactory(msgspec.Struct):
         try:
             return float(detail)
         except Exception as e:
-            return detail
+            return as_date(detail)
         
         
-    def make_link(self, data:dict):
-        return(Link(**{
-            "source": data.get(self.source_field), 
-            "target": data.get(self.target_field), 
-            "type":  data.get(self.type.value) if self.type.type == "field" else self.type.value,
-            "attr": { a: self.type_check( data.get(a, None) ) for a in self.attr }
-        }))
+    def make_batch(self, columns:dict) -> LinkBatch:
+        length = columns_length(columns)
+        sources, blank_sources = key_strings(column(columns, self.source_field, length))
+        targets, blank_targets = key_strings(column(columns, self.target_field, length))
+        return LinkBatch(
+            sources = sources,
+            targets = targets,
+            type = Categorical.encode(column(columns, self.type.value, length)) if self.type.type == "field" else Categorical.constant(self.type.value),
+            # each distinct value only needs to be checked once
+            attr = { a: Categorical.encode(column(columns, a, length)).map(self.type_check) for a in self.attr },
+            blank = [ s or t for s, t in zip(blank_sources, blank_targets) ]
+        )
 
 
 class GraphSchema(msgspec.Struct):
@@ -96,37 +381,48 @@ class GraphFactory(msgspec.Struct):
     node_factories : list[NodeFactory]
     link_factories : list[LinkFactory]
     
-    def make_nodes(self, data:dict, data_source:str):
-        return [ nf.make_node(data, data_source) for nf in self.node_factories ]
+    def make_batches(self, columns:dict, data_source:str, aliases:AliasIndex|None = None):
+        node_batches = [ nf.make_batch(columns, data_source) for nf in self.node_factories ]
+        link_batches = [ lf.make_batch(columns) for lf in self.link_factories ]
+        if aliases:
+            link_batches = [ lb.resolve(aliases) for lb in link_batches ]
+        return node_batches, link_batches
     
-    def nx_nodes(self, data:dict, data_source:str):
-        nodes = self.make_nodes(data, data_source)
-        return [ node.nx_format() for node in nodes]
+    def graph_from_columns(self, columns:dict, data_source:str, aliases:AliasIndex|None = None):
+        node_batches, link_batches = self.make_batches(columns, data_source, aliases)
+        skip = aliases.canonical if aliases else None
+        G = nx.MultiDiGraph()
+        G.add_nodes_from(interleave(node_batches, skip))
+        G.add_edges_from(interleave(link_batches))
+        return G
     
-    def make_links(self, data:dict):
-        return [ lf.make_link(data) for lf in self.link_factories ]
+    # Every column the factories read
+    def fields(self) -> list:
+        fields = self.key_fields()
+        for nf in self.node_factories:
+            fields += [ nf.label_field, nf.type.value if nf.type.type == "field" else None, *nf.attr ]
+        for lf in self.link_factories:
+            fields += [ lf.type.value if lf.type.type == "field" else None, *lf.attr ]
+        return [ f for f in dict.fromkeys(fields) if f ]
     
-    def nx_edges(self, data:dict):
-        links = self.make_links(data)
-        return [ link.nx_format() for link in links]
+    def key_fields(self) -> list:
+        fields = [ nf.id_field for nf in self.node_factories ]
+        for lf in self.link_factories:
+            fields += [lf.source_field, lf.target_field]
+        return list(dict.fromkeys(fields))
     
-    def make_graph(self, data:dict, data_source:str):
-        G = nx.MultiDiGraph()
-        G.add_nodes_from(self.nx_nodes(data, data_source))
-        G.add_edges_from(self.nx_edges(data))
-        return G 
-    
-    def make_graphs(self, data:list, data_source:str):
-        nodes = []
-        edges = []
-        for d in data:
-            nodes += self.nx_nodes(d, data_source)
-            edges += self.nx_edges(d)
-                    
-        G = nx.MultiDiGraph()
-        G.add_nodes_from(nodes)
-        G.add_edges_from(edges)
-        return G 
+    def make_graphs(self, data:list, data_source:str, aliases:AliasIndex|None = None):
+        return self.graph_from_columns(records_to_columns(data), data_source, aliases)
+
+    def store_graphs(self, data:Iterable, data_source:str, store, aliases:AliasIndex|None = None):
+        skip = aliases.canonical if aliases else None
+        for columns in data:
+            node_batches, link_batches = self.make_batches(columns, data_source, aliases)
+            store.add_nodes(interleave(node_batches, skip))
+            store.add_edges(interleave(link_batches))
+
+        store.commit()
+        return store
 
 
 
@@ -142,6 +438,7 @@ class SigmaFactory(msgspec.Struct):
     node_size : str | None = None
     node_size_range : tuple[int, int] = (3, 30)
     node_color : str = "type"
+    node_color_gradient : str | None = None
     clickable_edges : bool = False
     selected_node : str|None = None
     layout : dict|None = None
@@ -175,44 +472,68 @@ class SigmaFactory(msgspec.Struct):
             node_size =             self.node_size if self.node_size else G.degree,
             node_size_range =       self.node_size_range, 
             node_color =            self.node_color,
-            node_color_palette=     node_colors,
+            node_color_palette=     None if self.node_color_gradient else node_colors,
+            node_color_gradient=    self.node_color_gradient,
             selected_node=          self.selected_node,
             layout =                self.layout if layout is None else layout,
             start_layout =          (len(G) / 15 ) if layout is None else len(G) / 20,
             show_all_labels =        self.show_all_labels
         )
     
-    def export_graph(self, G:nx.MultiDiGraph, layout = None, camera_state = {}):
-        with io.BytesIO() as bytes_buf:
-            with io.TextIOWrapper(bytes_buf) as text_buf:
-                Sigma.write_html(
-                    G,
-                    path=text_buf,  
-                    height = self.height,
-                    
-                    edge_color = self.edge_color,
-                    edge_size = self.edge_size if self.edge_size else lambda x: 1,
-                    default_edge_color = self.default_edge_color,
-                    clickable_edges = self.clickable_edges,
-                    
-                    node_size = self.node_size if self.node_size else G.degree,
-                    node_size_range = self.node_size_range, 
-                    node_color = self.node_color,
-                    
-                    camera_state = self.camera_state if len(camera_state) == 0 else camera_state,
-                    layout= self.layout if layout is None else layout,
-                    layout_settings = self.layout_settings if self.layout_settings else {"StrongGravityMode": False},    
-                    start_layout = len(G) / 10
-                )
-                yield bytes_buf.getvalue()
-                
+    def export_graph(self, G:nx.MultiDiGraph, layout = None, camera_state = {}, compress:bool = False, chunk_size:int = 5000):
+        layout = self.layout if layout is None else layout
+        sigma = Sigma(
+            G,
+            height = self.height,
+            
+            edge_color = self.edge_color,
+            edge_size = self.edge_size if self.edge_size else lambda x: 1,
+            default_edge_color = self.default_edge_color,
+            clickable_edges = self.clickable_edges,
+            
+            node_size = self.node_size if self.node_size else G.degree,
+            node_size_range = self.node_size_range, 
+            node_color = self.node_color,
+            
+            camera_state = self.camera_state if len(camera_state) == 0 else camera_state,
+            layout = layout,
+            layout_settings = self.layout_settings if self.layout_settings else {"StrongGravityMode": False},    
+            # a saved layout is ready to view, so there's no need to run the layout again in the browser
+            start_layout = False if layout else len(G) / 10
+        )
+        chunks = html_chunks(sigma, chunk_size)
+        yield from gzip_chunks(chunks) if compress else chunks
+        sigma.close()
+
+
+# Content hashes of each node's and link's attributes, keyed by node id and by [source, target, key]
+class ContentHashes(msgspec.Struct):
+    nodes : dict = {}
+    edges : list = []
+    
+    def __len__(self):
+        return len(self.nodes) + len(self.edges)
+    
+    def edge_hashes(self) -> dict:
+        return { (u, v, k): h for u, v, k, h in self.edges }
 
 
 class QNG(msgspec.Struct):
     adjacency: dict
     node_attrs: dict
     sigma_factory: SigmaFactory
+    aliases: dict = {}
+    hashes: ContentHashes = msgspec.field(default_factory=ContentHashes)
+    
     def multigraph(self):
         MG = nx.from_dict_of_dicts(self.adjacency, multigraph_input=True, create_using=nx.MultiDiGraph)
         nx.set_node_attributes(MG, self.node_attrs)
-        return MG 
\ No newline at end of file
+        return MG
+    
+    def alias_index(self) -> AliasIndex:
+        index = AliasIndex.from_mapping(self.aliases)
+        # files saved before the index existed only have alias_ids on the merged nodes
+        for n, attrs in self.node_attrs.items():
+            if isinstance(attrs, dict) and attrs.get("alias_ids"):
+                index.union(n, [ a for a in attrs["alias_ids"] if a != n ])
+        return index 
\ No newline at end of file
@@ -0,0 +1,183 @@
+import os
+import re
+import time
+import glob
+import secrets
+import shutil
+import tempfile
+import msgspec
+import networkx as nx
+import pandas as pd
+from qng import NodeFactory, LinkFactory, SigmaFactory, AliasIndex
+from history import encode_graph, decode_graph, replay
+from snapshot import is_attached, touch
+
+
+SESSION_DIR = os.environ.get("QNG_SESSION_DIR", os.path.join(tempfile.gettempdir(), "qng_sessions"))
+WORKSPACE_ID = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+
+# The journal is folded into a full copy of the graph once it's bigger than this and the last copy
+MIN_COMPACT = 1 << 20
+
+# ...or once it holds this many edits (undo and redo included), so a restore never replays more than that
+CHECKPOINT_EDITS = 25
+
+# Each browser tab keeps the workspace id the server gave it in sessionStorage, so a reload or a
+# reconnect to any worker process finds the same workspace, but a copied URL or a new tab doesn't
+WORKSPACE_SCRIPT = """
+window.addEventListener("DOMContentLoaded", function() {
+    Shiny.addCustomMessageHandler("workspace", function(id) {
+        sessionStorage.setItem("qng_workspace", id);
+    });
+    $(document).on("shiny:connected", function() {
+        Shiny.setInputValue("workspace", sessionStorage.getItem("qng_workspace") || "");
+    });
+});
+"""
+
+
+def new_workspace_id() -> str:
+    return secrets.token_urlsafe(24)
+
+
+def workspace_id(value:str|None) -> str|None:
+    if not value or not WORKSPACE_ID.match(value):
+        return None
+    return value
+
+
+class SessionState(msgspec.Struct):
+    sigma_factory : SigmaFactory = msgspec.field(default_factory=SigmaFactory)
+    node_factories : dict[str, NodeFactory] = {}
+    link_factories : list[LinkFactory] = []
+    aliases : AliasIndex = msgspec.field(default_factory=AliasIndex)
+    filename : str | None = None
+    saved : float = 0
+
+
+def write_file(path:str, data:bytes):
+    fd, partial = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".partial")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(partial, path)
+
+
+# Everything a workspace needs to be picked up by another worker process, as compact files on local disk:
+# state.json (factories, style, aliases), frame.parquet, and the graph as graph-<n>.bin (zlib msgpack)
+# plus journal-<n>.bin, the edits made since. A new graph-<n>.bin starts a new journal, so a
+# half-finished save never replays old edits on top of a graph that already has them.
+class SessionStore:
+
+    def __init__(self, folder:str = SESSION_DIR):
+        self.folder = folder
+        # edits in each workspace's journal since its last full copy
+        self.edits = {}
+
+    def path(self, workspace:str, name:str) -> str:
+        return os.path.join(self.folder, workspace, name)
+
+    def exists(self, workspace:str) -> bool:
+        return os.path.exists(self.path(workspace, "state.json"))
+
+    def save_state(self, workspace:str, state:SessionState):
+        os.makedirs(os.path.join(self.folder, workspace), exist_ok=True)
+        state.saved = time.time()
+        write_file(self.path(workspace, "state.json"), msgspec.json.encode(state))
+
+    def generation(self, workspace:str) -> int:
+        found = [ int(os.path.basename(p)[6:-4]) for p in glob.glob(self.path(workspace, "graph-*.bin")) ]
+        return max(found, default=0)
+
+    def save_graph(self, workspace:str, G:nx.MultiDiGraph, aliases:AliasIndex):
+        os.makedirs(os.path.join(self.folder, workspace), exist_ok=True)
+        old = self.generation(workspace)
+        write_file(self.path(workspace, f"graph-{old + 1}.bin"), encode_graph(G, aliases))
+        self.edits[workspace] = 0
+        for name in [f"graph-{old}.bin", f"journal-{old}.bin"]:
+            if os.path.exists(self.path(workspace, name)):
+                os.remove(self.path(workspace, name))
+
+    def append_journal(self, workspace:str, records:list[bytes]):
+        os.makedirs(os.path.join(self.folder, workspace), exist_ok=True)
+        with open(self.path(workspace, f"journal-{self.generation(workspace)}.bin"), "ab") as f:
+            for record in records:
+                f.write(len(record).to_bytes(4, "little") + record)
+
+    def size(self, workspace:str, name:str) -> int:
+        path = self.path(workspace, f"{name}-{self.generation(workspace)}.bin")
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+    # Saving costs about what the edits did. The full graph is written again as a checkpoint every
+    # CHECKPOINT_EDITS edits, or once the journal outgrows it. A graph on a shared snapshot isn't copied
+    # out of it until the journal outgrows the snapshot too.
+    def save_changes(self, workspace:str, G:nx.MultiDiGraph, aliases:AliasIndex, records:list[bytes]):
+        if len(records) == 0:
+            return
+        self.append_journal(workspace, records)
+        self.edits[workspace] = self.edits.get(workspace, 0) + len(records)
+        shared = 0
+        if is_attached(G):
+            # the workspace still needs the snapshot, so it isn't cleaned up before the workspace is
+            touch(G._node.overlay.snapshot.path)
+            shared = os.path.getsize(G._node.overlay.snapshot.path)
+        elif self.edits[workspace] >= CHECKPOINT_EDITS:
+            self.save_graph(workspace, G, aliases)
+            return
+        if self.size(workspace, "journal") > max(self.size(workspace, "graph"), shared, MIN_COMPACT):
+            self.save_graph(workspace, G, aliases)
+
+    def save_frame(self, workspace:str, frame:pd.DataFrame):
+        os.makedirs(os.path.join(self.folder, workspace), exist_ok=True)
+        fd, partial = tempfile.mkstemp(dir=os.path.join(self.folder, workspace), suffix=".partial")
+        os.close(fd)
+        frame.to_parquet(partial)
+        os.replace(partial, self.path(workspace, "frame.parquet"))
+
+    def load_state(self, workspace:str) -> SessionState:
+        with open(self.path(workspace, "state.json"), "rb") as f:
+            return msgspec.json.decode(f.read(), type=SessionState)
+
+    def journal(self, workspace:str):
+        path = self.path(workspace, f"journal-{self.generation(workspace)}.bin")
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as f:
+            while len(header := f.read(4)) == 4:
+                record = f.read(int.from_bytes(header, "little"))
+                # a record cut short by a crash mid-write is dropped, along with anything after it
+                if len(record) < int.from_bytes(header, "little"):
+                    return
+                yield record
+
+    # Loads the saved graph into G in place and replays the edits since; returns its aliases, or None if there isn't one
+    def load_graph(self, workspace:str, G:nx.MultiDiGraph) -> AliasIndex|None:
+        path = self.path(workspace, f"graph-{self.generation(workspace)}.bin")
+        records = list(self.journal(workspace))
+        if not os.path.exists(path) and len(records) == 0:
+            return None
+        G.clear()
+        aliases = AliasIndex()
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                aliases = decode_graph(f.read(), G)
+        for record in records:
+            replay(record, G, aliases)
+        self.edits[workspace] = len(records)
+        return aliases
+
+    def load_frame(self, workspace:str) -> pd.DataFrame|None:
+        path = self.path(workspace, "frame.parquet")
+        return pd.read_parquet(path) if os.path.exists(path) else None
+
+    def delete(self, workspace:str):
+        shutil.rmtree(os.path.join(self.folder, workspace), ignore_errors=True)
+
+    # Workspaces nobody has saved to in max_age seconds
+    def cleanup(self, max_age:float):
+        if not os.path.exists(self.folder):
+            return
+        now = time.time()
+        for workspace in os.listdir(self.folder):
+            path = self.path(workspace, "state.json")
+            if os.path.exists(path) and now - os.path.getmtime(path) > max_age:
+                self.delete(workspace)
@@ -0,0 +1,372 @@
+import os
+import time
+import weakref
+import hashlib
+import tempfile
+import msgspec
+import numpy as np
+import networkx as nx
+from abc import abstractmethod
+from collections.abc import MutableMapping
+
+
+SNAPSHOT_DIR = os.environ.get("QNG_SNAPSHOT_DIR", os.path.join(tempfile.gettempdir(), "qng_snapshots"))
+ALIGN = 8
+
+
+def pack(items:list) -> tuple[bytes, np.ndarray]:
+    encoder = msgspec.msgpack.Encoder()
+    parts = [ encoder.encode(item) for item in items ]
+    offsets = np.zeros(len(parts) + 1, dtype=np.int64)
+    np.cumsum([ len(p) for p in parts ], out=offsets[1:])
+    return b"".join(parts), offsets
+
+
+def row_index(ends:np.ndarray, n:int) -> tuple[np.ndarray, np.ndarray]:
+    order = np.argsort(ends, kind="stable")
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(ends, minlength=n), out=indptr[1:])
+    return indptr, order.astype(np.int64)
+
+
+# Flat arrays in one file: node ids, msgpack-encoded attributes, and the links sorted by source
+# and by target, so any node's neighbors are a slice that can be read straight from the mapping
+def write_snapshot(G:nx.MultiDiGraph, path:str, meta:dict = {}):
+    ids = list(G)
+    index = { n: i for i, n in enumerate(ids) }
+    edges = list(G.edges(keys=True, data=True))
+    source = np.array([ index[u] for u, _, _, _ in edges ], dtype=np.int64)
+    target = np.array([ index[v] for _, v, _, _ in edges ], dtype=np.int64)
+    node_blob, node_offsets = pack([ G.nodes[n] for n in ids ])
+    edge_blob, edge_offsets = pack([ [k, d] for _, _, k, d in edges ])
+    succ_indptr, succ_edges = row_index(source, len(ids))
+    pred_indptr, pred_edges = row_index(target, len(ids))
+
+    arrays = {
+        "ids": np.frombuffer(msgspec.msgpack.encode(ids), dtype=np.uint8),
+        "source": source, "target": target,
+        "node_blob": np.frombuffer(node_blob, dtype=np.uint8), "node_offsets": node_offsets,
+        "edge_blob": np.frombuffer(edge_blob, dtype=np.uint8), "edge_offsets": edge_offsets,
+        "succ_indptr": succ_indptr, "succ_edges": succ_edges,
+        "pred_indptr": pred_indptr, "pred_edges": pred_edges,
+    }
+    layout, offset = {}, 0
+    for name, a in arrays.items():
+        layout[name] = [offset, a.dtype.str, a.nbytes]
+        offset += -(-a.nbytes // ALIGN) * ALIGN
+    header = msgspec.msgpack.encode({"meta": meta, "arrays": layout})
+    start = -(-(8 + len(header)) // ALIGN) * ALIGN
+
+    # written beside the target and renamed, so other workers never map a half-written file
+    fd, partial = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".partial")
+    with os.fdopen(fd, "wb") as f:
+        f.write(len(header).to_bytes(8, "little"))
+        f.write(header)
+        for name, a in arrays.items():
+            f.seek(start + layout[name][0])
+            f.write(a.tobytes())
+    os.replace(partial, path)
+
+
+# A read-only graph mapped from disk. Every session and worker process that opens the same file
+# shares the operating system's copy of it.
+class GraphSnapshot:
+
+    def __init__(self, path:str):
+        self.path = path
+        with open(path, "rb") as f:
+            size = int.from_bytes(f.read(8), "little")
+            header = msgspec.msgpack.decode(f.read(size))
+        self.meta = header["meta"]
+        start = -(-(8 + size) // ALIGN) * ALIGN
+        data = np.memmap(path, dtype=np.uint8, mode="r")
+        self.arrays = {
+            name: data[start + offset:start + offset + nbytes].view(np.dtype(dtype))
+            for name, (offset, dtype, nbytes) in header["arrays"].items()
+        }
+        # the id lookup is the one structure each process builds for itself
+        self.ids = msgspec.msgpack.decode(memoryview(self.arrays["ids"]))
+        self.index = { n: i for i, n in enumerate(self.ids) }
+        self.decoder = msgspec.msgpack.Decoder()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, n):
+        return n in self.index
+
+    def number_of_edges(self) -> int:
+        return len(self.arrays["source"])
+
+    def blob(self, name:str, i:int):
+        offsets = self.arrays[f"{name}_offsets"]
+        return self.decoder.decode(memoryview(self.arrays[f"{name}_blob"][offsets[i]:offsets[i + 1]]))
+
+    def node_attrs(self, n) -> dict:
+        return self.blob("node", self.index[n])
+
+    # (neighbor, key, attrs) for each link leaving n, or arriving at it
+    def links(self, n, direction:str = "succ"):
+        i = self.index[n]
+        indptr, order = self.arrays[f"{direction}_indptr"], self.arrays[f"{direction}_edges"]
+        other = self.arrays["target" if direction == "succ" else "source"]
+        for e in order[indptr[i]:indptr[i + 1]].tolist():
+            key, attrs = self.blob("edge", e)
+            yield self.ids[other[e]], key, attrs
+
+
+# A dict handed out from the snapshot. Reading it costs nothing after it's dropped;
+# the first change to it makes it the session's own copy.
+class CopyOnWrite(dict):
+    __slots__ = ("on_write",)
+
+    def __init__(self, *args, on_write=None):
+        super().__init__(*args)
+        self.on_write = on_write
+
+    def written(self):
+        if self.on_write is not None:
+            on_write, self.on_write = self.on_write, None
+            on_write(self)
+
+    def __setitem__(self, key, value):
+        self.written()
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        self.written()
+        super().__delitem__(key)
+
+    def update(self, *args, **kwargs):
+        self.written()
+        super().update(*args, **kwargs)
+
+    def pop(self, *args):
+        self.written()
+        return super().pop(*args)
+
+    def popitem(self):
+        self.written()
+        return super().popitem()
+
+    def setdefault(self, key, default=None):
+        self.written()
+        return super().setdefault(key, default)
+
+    def clear(self):
+        self.written()
+        super().clear()
+
+
+# The changes one graph makes on top of a snapshot. Link key dicts are shared by the
+# successor and predecessor sides, the same way networkx shares them.
+class Overlay:
+
+    def __init__(self, snapshot:GraphSnapshot|None):
+        self.snapshot = snapshot
+        self.keydicts = {}
+
+    def own_keydict(self, pair:tuple, keydict:dict) -> dict:
+        owned = self.keydicts.setdefault(pair, keydict)
+        if owned is keydict and isinstance(keydict, CopyOnWrite):
+            keydict.on_write = None
+        return owned
+
+
+# A node-keyed mapping that reads from the snapshot until a key is written, added or removed
+class LazyMap(MutableMapping):
+
+    def __init__(self, overlay:Overlay):
+        self.overlay = overlay
+        self.owned = {}
+        self.removed = set()
+        self.extra = {}
+
+    def in_base(self, key) -> bool:
+        return self.overlay.snapshot is not None and key in self.overlay.snapshot and key not in self.removed
+
+    @abstractmethod
+    def load(self, key):
+        ...
+
+    def own(self, key, value):
+        self.owned[key] = value
+
+    def __getitem__(self, key):
+        if key in self.owned:
+            return self.owned[key]
+        if self.in_base(key):
+            return self.load(key)
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if self.overlay.snapshot is None or key not in self.overlay.snapshot:
+            self.extra[key] = None
+        self.removed.discard(key)
+        self.owned[key] = value
+
+    def __delitem__(self, key):
+        if key in self.owned:
+            del self.owned[key]
+            self.extra.pop(key, None)
+        elif not self.in_base(key):
+            raise KeyError(key)
+        if self.overlay.snapshot is not None and key in self.overlay.snapshot:
+            self.removed.add(key)
+
+    def __contains__(self, key):
+        return key in self.owned or self.in_base(key)
+
+    def __iter__(self):
+        if self.overlay.snapshot is not None:
+            for key in self.overlay.snapshot.ids:
+                if key not in self.removed:
+                    yield key
+        yield from list(self.extra)
+
+    def __len__(self):
+        base = len(self.overlay.snapshot) if self.overlay.snapshot is not None else 0
+        return base - len(self.removed) + len(self.extra)
+
+    def clear(self):
+        self.overlay.snapshot = None
+        self.overlay.keydicts = {}
+        self.owned = {}
+        self.removed = set()
+        self.extra = {}
+
+
+class NodeMap(LazyMap):
+
+    def load(self, n):
+        return CopyOnWrite(self.overlay.snapshot.node_attrs(n), on_write=lambda d: self.own(n, d))
+
+
+class AdjacencyMap(LazyMap):
+
+    def __init__(self, overlay:Overlay, direction:str):
+        super().__init__(overlay)
+        self.direction = direction
+
+    def pair(self, n, neighbor) -> tuple:
+        return (n, neighbor) if self.direction == "succ" else (neighbor, n)
+
+    def load(self, n):
+        overlay = self.overlay
+        row = CopyOnWrite(on_write=lambda r: self.own(n, r))
+        for neighbor, key, attrs in overlay.snapshot.links(n, self.direction):
+            pair = self.pair(n, neighbor)
+            if pair in overlay.keydicts:
+                dict.__setitem__(row, neighbor, overlay.keydicts[pair])
+                continue
+            keydict = row.get(neighbor)
+            if keydict is None:
+                keydict = CopyOnWrite(on_write=lambda k, pair=pair: overlay.own_keydict(pair, k))
+                dict.__setitem__(row, neighbor, keydict)
+            dict.__setitem__(keydict, key, CopyOnWrite(attrs, on_write=lambda d, pair=pair, k=keydict: overlay.own_keydict(pair, k)))
+        return row
+
+    # a row that's about to change can't keep private key dicts the other side doesn't know about
+    def own(self, n, row):
+        for neighbor, keydict in list(dict.items(row)):
+            dict.__setitem__(row, neighbor, self.overlay.own_keydict(self.pair(n, neighbor), keydict))
+        super().own(n, row)
+
+
+def is_attached(G:nx.MultiDiGraph) -> bool:
+    return isinstance(G._node, LazyMap) and G._node.overlay.snapshot is not None
+
+
+# Node and link counts the graph holds privately, on top of its snapshot
+def private_counts(G:nx.MultiDiGraph) -> tuple[int, int]:
+    nodes = len(G._node.owned) + len(G._node.removed)
+    rows = G._succ.owned
+    edges = sum(len(keydict) for row in rows.values() for keydict in row.values()) + \
+            sum(len(keydict) for (u, _), keydict in G._succ.overlay.keydicts.items() if u not in rows)
+    return nodes, edges
+
+
+def reset_views(G:nx.MultiDiGraph):
+    for name in ["nodes", "adj", "succ", "pred", "edges", "out_edges", "in_edges", "degree", "in_degree", "out_degree"]:
+        G.__dict__.pop(name, None)
+
+
+# Puts an empty graph on top of a snapshot without copying it
+def attach(G:nx.MultiDiGraph, snapshot:GraphSnapshot):
+    if len(G) > 0:
+        raise ValueError("Only an empty graph can be attached to a snapshot")
+    overlay = Overlay(snapshot)
+    G._node = NodeMap(overlay)
+    G._succ = G._adj = AdjacencyMap(overlay, "succ")
+    G._pred = AdjacencyMap(overlay, "pred")
+    reset_views(G)
+
+
+def detach(G:nx.MultiDiGraph):
+    G._node = {}
+    G._succ = G._adj = {}
+    G._pred = {}
+    reset_views(G)
+
+
+def file_hash(path:str) -> str:
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Snapshots this process has mapped, by the hash of the file they came from.
+# Each is unmapped once no graph or history refers to it any more.
+snapshots = weakref.WeakValueDictionary()
+
+
+# Marks a snapshot file as in use, so cleanup_snapshots leaves it alone
+def touch(path:str):
+    os.utime(path)
+
+
+# Maps the snapshot of a file, publishing it first if no session or worker has yet.
+# `build` returns the graph and any metadata to keep with it.
+def shared_snapshot(path:str, build) -> GraphSnapshot:
+    key = file_hash(path)
+    snapshot = snapshots.get(key)
+    if snapshot is None:
+        snapshot_path = os.path.join(SNAPSHOT_DIR, f"{key}.qngsnap")
+        if os.path.exists(snapshot_path):
+            touch(snapshot_path)
+        else:
+            os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+            G, meta = build()
+            write_snapshot(G, snapshot_path, meta)
+        snapshot = snapshots[key] = GraphSnapshot(snapshot_path)
+    return snapshot
+
+
+# Maps a snapshot file already published, e.g. one a saved workspace refers to
+def open_snapshot(path:str) -> GraphSnapshot:
+    key = os.path.splitext(os.path.basename(path))[0]
+    snapshot = snapshots.get(key)
+    if snapshot is None:
+        snapshot = snapshots[key] = GraphSnapshot(path)
+        touch(path)
+    return snapshot
+
+
+# Snapshot files (and half-written ones) nobody has opened or saved against in max_age seconds.
+# Ones this process still has mapped are kept; a workspace whose snapshot is gone can't be restored.
+def cleanup_snapshots(max_age:float):
+    if not os.path.exists(SNAPSHOT_DIR):
+        return
+    now = time.time()
+    mapped = { snapshot.path for snapshot in list(snapshots.values()) }
+    for name in os.listdir(SNAPSHOT_DIR):
+        path = os.path.join(SNAPSHOT_DIR, name)
+        if path in mapped or not name.endswith((".qngsnap", ".partial")):
+            continue
+        try:
+            if now - os.path.getmtime(path) > max_age:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
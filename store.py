@@ -0,0 +1,190 @@
+import os
+import tempfile
+import sqlite3
+import msgspec
+import networkx as nx
+from neighborhood import Neighborhood
+
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS nodes (
+        id TEXT PRIMARY KEY,
+        label TEXT,
+        type TEXT,
+        data_source TEXT,
+        attrs TEXT
+    );
+    CREATE TABLE IF NOT EXISTS edges (
+        source TEXT NOT NULL,
+        target TEXT NOT NULL,
+        type TEXT,
+        attrs TEXT
+    );
+    -- attrs holds every attribute, type included, so building the same rows again adds nothing
+    CREATE UNIQUE INDEX IF NOT EXISTS edges_unique ON edges(source, target, attrs);
+    CREATE INDEX IF NOT EXISTS edges_source ON edges(source);
+    CREATE INDEX IF NOT EXISTS edges_target ON edges(target);
+    CREATE INDEX IF NOT EXISTS nodes_type ON nodes(type);
+"""
+
+# SQLite caps the number of bound parameters per statement
+CHUNK_SIZE = 900
+
+
+def chunks(items:list, size:int = CHUNK_SIZE):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+# Out-of-core graph: node and edge tables on disk, queried without loading the whole graph
+class GraphStore:
+
+    def __init__(self, path:str = ":memory:"):
+        self.path = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+
+    # A store in a temporary file, for delete() to clean up
+    @classmethod
+    def temporary(cls):
+        fd, path = tempfile.mkstemp(suffix=".qngdb")
+        os.close(fd)
+        return cls(path)
+
+    def close(self):
+        self.db.close()
+
+    def delete(self):
+        self.close()
+        if self.path != ":memory:" and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __len__(self):
+        return self.db.execute("SELECT count(*) FROM nodes").fetchone()[0]
+
+    # nodes that only ever appeared as link endpoints are in the graph too
+    def __contains__(self, node):
+        return self.db.execute("""
+            SELECT 1 FROM nodes WHERE id = ?1
+            UNION ALL SELECT 1 FROM edges WHERE source = ?1
+            UNION ALL SELECT 1 FROM edges WHERE target = ?1
+            LIMIT 1
+        """, (node,)).fetchone() is not None
+
+
+    ### Writes
+
+    def add_nodes(self, nodes):
+        # later attributes update earlier ones, and nulls are kept, the same way G.add_nodes_from does
+        merged = {}
+        for n, attrs in nodes:
+            merged.setdefault(str(n), {}).update(attrs)
+        for chunk in chunks(merged):
+            marks = ",".join("?" * len(chunk))
+            for n, attrs in self.db.execute(f"SELECT id, attrs FROM nodes WHERE id IN ({marks})", chunk):
+                merged[n] = {**msgspec.json.decode(attrs), **merged[n]}
+        rows = [
+            (n, attrs.get("label"), attrs.get("type"), attrs.get("data_source"), msgspec.json.encode(attrs).decode())
+            for n, attrs in merged.items()
+        ]
+        self.db.executemany("""
+            INSERT INTO nodes VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET
+                label = excluded.label,
+                type = excluded.type,
+                data_source = excluded.data_source,
+                attrs = excluded.attrs
+        """, rows)
+
+    def add_edges(self, edges):
+        rows = [
+            (str(s), str(t), attrs.get("type"), msgspec.json.encode(attrs).decode())
+            for s, t, attrs in edges
+        ]
+        self.db.executemany("INSERT OR IGNORE INTO edges VALUES (?, ?, ?, ?)", rows)
+
+    def commit(self):
+        self.db.commit()
+
+
+    ### Queries
+
+    def neighbors(self, nodes:list) -> set:
+        found = set()
+        for chunk in chunks(nodes):
+            marks = ",".join("?" * len(chunk))
+            rows = self.db.execute(f"""
+                SELECT target FROM edges WHERE source IN ({marks})
+                UNION
+                SELECT source FROM edges WHERE target IN ({marks})
+            """, chunk + chunk)
+            found.update(r[0] for r in rows)
+        return found
+
+    def degree(self, node) -> int:
+        return self.db.execute(
+            "SELECT (SELECT count(*) FROM edges WHERE source = ?1) + (SELECT count(*) FROM edges WHERE target = ?1)", (node,)
+        ).fetchone()[0]
+
+    def distances(self, node, limit:int|None = None, stop_at = None) -> dict:
+        dist = {node: 0}
+        frontier = [node]
+        depth = 0
+        while frontier and (limit is None or depth < limit):
+            depth += 1
+            frontier = [n for n in self.neighbors(frontier) if n not in dist]
+            for n in frontier:
+                dist[n] = depth
+            if stop_at is not None and stop_at in dist:
+                break
+        return dist
+
+    def path_nodes(self, node_1, node_2) -> set:
+        # A node is on a shortest path when its distance from each end adds up to the path length
+        from_start = self.distances(node_1, stop_at=node_2)
+        if node_2 not in from_start:
+            return set()
+        length = from_start[node_2]
+        from_end = self.distances(node_2, limit=length)
+        return { n for n in from_start if n in from_end and from_start[n] + from_end[n] == length }
+
+    def first_nodes(self, limit:int) -> list:
+        return [ r[0] for r in self.db.execute("SELECT id FROM nodes ORDER BY rowid LIMIT ?", (limit,)) ]
+
+
+    ### Load into networkx
+
+    def subgraph(self, nodes) -> nx.MultiDiGraph:
+        G = nx.MultiDiGraph()
+        self.db.execute("CREATE TEMP TABLE IF NOT EXISTS selected (id TEXT PRIMARY KEY)")
+        self.db.execute("DELETE FROM selected")
+        self.db.executemany("INSERT OR IGNORE INTO selected VALUES (?)", ((n,) for n in nodes))
+
+        G.add_nodes_from(
+            (n, msgspec.json.decode(attrs))
+            for n, attrs in self.db.execute("SELECT nodes.id, nodes.attrs FROM nodes JOIN selected ON nodes.id = selected.id")
+        )
+        # nodes that only ever appeared as link endpoints have no details
+        G.add_nodes_from(r[0] for r in self.db.execute("SELECT id FROM selected"))
+        G.add_edges_from(
+            (s, t, msgspec.json.decode(attrs))
+            for s, t, attrs in self.db.execute("""
+                SELECT edges.source, edges.target, edges.attrs FROM edges
+                JOIN selected s ON edges.source = s.id
+                JOIN selected t ON edges.target = t.id
+            """)
+        )
+        self.db.execute("DELETE FROM selected")
+        return G
+
+    def path_graph(self, node_1, node_2) -> nx.MultiDiGraph:
+        return self.subgraph(self.path_nodes(node_1, node_2))
+
+
+
+# Neighborhood's bounded hop search, reading each node's links from the store
+class StoreNeighborhood(Neighborhood):
+
+    def neighbors(self, node):
+        return sorted(self.G.neighbors([node]))
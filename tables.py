@@ -0,0 +1,177 @@
+import io
+import os
+import zipfile
+import tempfile
+import msgspec
+import networkx as nx
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from itertools import islice
+
+
+NODE_FIELDS = ["id", "label", "type", "data_source"]
+EDGE_FIELDS = ["source", "target", "key", "type"]
+
+NODE_SCHEMA = pa.schema([ (f, pa.string()) for f in NODE_FIELDS ] + [ ("attrs", pa.string()) ])
+EDGE_SCHEMA = pa.schema([ (f, pa.string()) for f in EDGE_FIELDS ] + [ ("attrs", pa.string()) ])
+
+FORMATS = {"parquet": "Parquet", "arrow": "Arrow IPC"}
+
+# Ids are written as text; the schema notes when they were all whole numbers, so they come back as numbers
+ID_TYPE = b"qng.id_type"
+ID_TYPES = {b"int": pa.int64()}
+
+encoder = msgspec.json.Encoder(enc_hook=str)
+decoder = msgspec.json.Decoder()
+
+
+def text(value) -> str|None:
+    return None if value is None else str(value)
+
+
+# Everything but the fixed columns goes in attrs, as JSON
+def extra_attrs(attrs:dict, fields:list) -> str|None:
+    extra = { k: v for k, v in attrs.items() if k not in fields }
+    return encoder.encode(extra).decode() if extra else None
+
+
+def id_type(G:nx.MultiDiGraph) -> bytes:
+    return b"int" if len(G) > 0 and all(type(n) is int for n in G) else b"str"
+
+
+def node_rows(G:nx.MultiDiGraph):
+    for n, attrs in G.nodes(data=True):
+        yield (text(n), text(attrs.get("label")), text(attrs.get("type")), text(attrs.get("data_source")), extra_attrs(attrs, NODE_FIELDS))
+
+
+def edge_rows(G:nx.MultiDiGraph):
+    for u, v, k, attrs in G.edges(keys=True, data=True):
+        yield (text(u), text(v), text(k), text(attrs.get("type")), extra_attrs(attrs, EDGE_FIELDS))
+
+
+def record_batches(rows, schema:pa.Schema, batch_size:int):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, batch_size))
+        if len(chunk) == 0:
+            break
+        yield pa.RecordBatch.from_arrays([ pa.array(c, type=pa.string()) for c in zip(*chunk) ], schema=schema)
+
+
+# Whatever has been written since it was last drained. It can't seek, so zipfile
+# streams each member with a data descriptor instead of going back to patch its header.
+class ChunkSink(io.RawIOBase):
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        chunks, self.chunks = self.chunks, []
+        return b"".join(chunks)
+
+
+# One row group (or IPC record batch) at a time, so the whole table is never in memory.
+# Yields after each batch is written.
+def write_table(rows, schema:pa.Schema, sink, format:str = "parquet", batch_size:int = 50000):
+    if format == "parquet":
+        writer = pq.ParquetWriter(sink, schema)
+    else:
+        writer = pa.ipc.new_file(sink, schema, options=pa.ipc.IpcWriteOptions(compression="zstd"))
+    with writer:
+        for batch in record_batches(rows, schema, batch_size):
+            writer.write_batch(batch)
+            yield
+
+
+# nodes.<format> and edges.<format> in one zip file, a batch at a time as it's written
+def export_tables(G:nx.MultiDiGraph, format:str = "parquet", batch_size:int = 50000):
+    sink = ChunkSink()
+    metadata = {ID_TYPE: id_type(G)}
+    with zipfile.ZipFile(sink, "w") as z:
+        for name, rows, schema in [("nodes", node_rows(G), NODE_SCHEMA), ("edges", edge_rows(G), EDGE_SCHEMA)]:
+            schema = schema.with_metadata(metadata)
+            with z.open(f"{name}.{format}", "w") as member:
+                for _ in write_table(rows, schema, pa.PythonFile(member, mode="w"), format, batch_size):
+                    yield sink.drain()
+    yield sink.drain()
+
+
+def table_format(path:str) -> str:
+    return "parquet" if path.endswith(".parquet") else "ipc"
+
+
+def merged_attrs(values:list, attrs:list|None) -> dict:
+    fixed = { k: v for k, v in values if v is not None }
+    return { **decoder.decode(attrs), **fixed } if attrs else fixed
+
+
+# Reads only the columns the graph needs and lets Arrow skip rows with blank ids, and cast
+# the ids back to numbers, before they reach Python; then adds each batch to the graph column by column
+def read_batches(path:str, fields:list, ids:list):
+    dataset = ds.dataset(path, format=table_format(path))
+    columns = [ f for f in fields + ["attrs"] if f in dataset.schema.names ]
+    cast = ID_TYPES.get((dataset.schema.metadata or {}).get(ID_TYPE))
+    condition = None
+    for f in ids:
+        condition = ds.field(f).is_valid() if condition is None else condition & ds.field(f).is_valid()
+    for batch in dataset.to_batches(columns=columns, filter=condition):
+        yield { c: (batch.column(c).cast(cast) if cast and c in ids else batch.column(c)).to_pylist() for c in columns }
+
+
+def add_nodes(G:nx.MultiDiGraph, path:str):
+    for batch in read_batches(path, NODE_FIELDS, ["id"]):
+        fixed = [ f for f in ["label", "type", "data_source"] if f in batch ]
+        attrs = batch.get("attrs") or [None] * len(batch["id"])
+        G.add_nodes_from(
+            (n, merged_attrs(list(zip(fixed, values)), a))
+            for n, a, *values in zip(batch["id"], attrs, *[ batch[f] for f in fixed ])
+        )
+
+
+# Keys are written as text; the numbered keys networkx gives links come back as numbers,
+# so links already in the graph are matched rather than added again
+def link_key(key:str|None):
+    return int(key) if key is not None and key.isdecimal() else key
+
+
+def add_edges(G:nx.MultiDiGraph, path:str):
+    for batch in read_batches(path, EDGE_FIELDS, ["source", "target"]):
+        keys = batch.get("key") or [None] * len(batch["source"])
+        attrs = batch.get("attrs") or [None] * len(batch["source"])
+        link_types = batch.get("type") or [None] * len(batch["source"])
+        G.add_edges_from(
+            (u, v, link_key(k), merged_attrs([("type", t)], a))
+            for u, v, k, t, a in zip(batch["source"], batch["target"], keys, link_types, attrs)
+        )
+
+
+def table_paths(folder:str) -> dict:
+    found = {}
+    for name in os.listdir(folder):
+        stem, _, extension = name.rpartition(".")
+        if stem in ["nodes", "edges"] and extension in ["parquet", "arrow", "feather"]:
+            found[stem] = os.path.join(folder, name)
+    return found
+
+
+# A graph from a zip of node and edge tables, as written by export_tables. The node table is optional.
+def import_tables(path:str) -> nx.MultiDiGraph:
+    G = nx.MultiDiGraph()
+    with tempfile.TemporaryDirectory() as folder:
+        with zipfile.ZipFile(path) as z:
+            z.extractall(folder)
+        paths = table_paths(folder)
+        if "edges" not in paths:
+            raise ValueError("No edges table (edges.parquet or edges.arrow) in the file")
+        if "nodes" in paths:
+            add_nodes(G, paths["nodes"])
+        add_edges(G, paths["edges"])
+    return G
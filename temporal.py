@@ -0,0 +1,82 @@
+import numpy as np
+import networkx as nx
+from datetime import date
+
+
+EARLIEST = np.datetime64("0001-01-01")
+LATEST = np.datetime64("9999-12-31")
+
+
+def to_day(value, missing):
+    if value is None or value == "":
+        return missing
+    try:
+        day = np.datetime64(str(value)[:10], "D")
+    except ValueError:
+        return missing
+    return missing if np.isnat(day) else day
+
+
+# Links sorted by when they start and when they end, so a window on the timeline can be
+# answered with binary searches, and moving the window only looks at links crossing its edges
+class TemporalIndex:
+
+    def __init__(self, G:nx.MultiDiGraph, start_key:str, end_key:str|None = None):
+        self.G = G
+        self.edges = list(G.edges(keys=True))
+        attrs = [ d for _, _, d in G.edges(data=True) ]
+        # links without a start have always existed; links without an end still do
+        self.starts = np.array([ to_day(a.get(start_key), EARLIEST) for a in attrs ], dtype="datetime64[D]")
+        self.ends = np.array([ to_day(a.get(end_key), LATEST) if end_key else LATEST for a in attrs ], dtype="datetime64[D]")
+
+        self.by_start = np.argsort(self.starts, kind="stable")
+        self.by_end = np.argsort(self.ends, kind="stable")
+        self.sorted_starts = self.starts[self.by_start]
+        self.sorted_ends = self.ends[self.by_end]
+
+        self.window = None
+        self.active = set()
+
+    def __len__(self):
+        return len(self.edges)
+
+    def date_range(self) -> tuple[date, date] | None:
+        known = np.concatenate([ self.starts[self.starts != EARLIEST], self.ends[self.ends != LATEST] ])
+        if len(known) == 0:
+            return None
+        return known.min().item(), known.max().item()
+
+    def is_active(self, i:int, first, last) -> bool:
+        return self.starts[i] <= last and self.ends[i] >= first
+
+    def crossing(self, sorted_days, order, a, b) -> np.ndarray:
+        low, high = sorted(( a, b ))
+        return order[np.searchsorted(sorted_days, low, side="left"):np.searchsorted(sorted_days, high, side="right")]
+
+    # Links active at any point from first to last (inclusive)
+    def query(self, first, last=None) -> set:
+        first = np.datetime64(first, "D")
+        last = first if last is None else np.datetime64(last, "D")
+
+        if self.window is None:
+            candidates = self.by_start[:np.searchsorted(self.sorted_starts, last, side="right")]
+            self.active = { i for i in candidates.tolist() if self.ends[i] >= first }
+        else:
+            previous_first, previous_last = self.window
+            # only links that start or end between the old and new window edges can change
+            candidates = np.concatenate([
+                self.crossing(self.sorted_starts, self.by_start, previous_last, last),
+                self.crossing(self.sorted_ends, self.by_end, previous_first, first),
+            ])
+            for i in candidates.tolist():
+                if self.is_active(i, first, last):
+                    self.active.add(i)
+                else:
+                    self.active.discard(i)
+
+        self.window = (first, last)
+        return self.active
+
+    def subgraph(self, first, last=None) -> nx.MultiDiGraph:
+        edges = [ self.edges[i] for i in self.query(first, last) ]
+        return nx.edge_subgraph(self.G, edges)
@@ -0,0 +1,40 @@
+import networkx as nx
+from qng import AliasIndex
+from history import History
+
+
+def graph() -> nx.MultiDiGraph:
+    G = nx.MultiDiGraph()
+    G.add_node("JOHN SMITH", type="person")
+    G.add_node("SMITH, JOHN", type="person", source="b.csv")
+    G.add_node("J SMITH", type="person")
+    G.add_edge("SMITH, JOHN", "ACME LLC", type="agent of")
+    G.add_edge("J SMITH", "BETA INC", type="agent of")
+    return G
+
+
+def test_loaded_aliases_combine_nodes_already_in_the_graph():
+    G = graph()
+    history = History(G)
+    with history.edit("load graph") as edit:
+        edit.add_aliases(AliasIndex.from_mapping({"SMITH, JOHN": "JOHN SMITH", "J SMITH": "JOHN SMITH"}))
+
+    assert "SMITH, JOHN" not in G and "J SMITH" not in G
+    assert set(G.successors("JOHN SMITH")) == {"ACME LLC", "BETA INC"}
+    assert history.aliases.find("J SMITH") == "JOHN SMITH"
+
+    history.undo()
+    assert nx.utils.graphs_equal(G, graph())
+    assert history.aliases.find("J SMITH") == "J SMITH"
+
+
+def test_the_kept_id_is_added_when_only_its_aliases_are_in_the_graph():
+    G = graph()
+    G.remove_node("JOHN SMITH")
+    history = History(G)
+    with history.edit("load graph") as edit:
+        edit.add_aliases(AliasIndex.from_mapping({"SMITH, JOHN": "JOHN SMITH"}))
+    assert G.nodes["JOHN SMITH"]["source"] == "b.csv"
+    assert list(G.successors("JOHN SMITH")) == ["ACME LLC"]
+    history.undo()
+    assert nx.utils.graphs_equal(G, nx.MultiDiGraph(graph().subgraph(["SMITH, JOHN", "J SMITH", "ACME LLC", "BETA INC"])))
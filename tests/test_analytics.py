@@ -0,0 +1,66 @@
+import pytest
+import networkx as nx
+from analytics import Analytics, CSRSnapshot, compute_metric
+from history import History
+from sessions import SessionStore
+
+
+def graph() -> nx.MultiDiGraph:
+    G = nx.MultiDiGraph(nx.gnm_random_graph(60, 150, seed=5, directed=True))
+    # a parallel link and a self loop, which the sparse matrices have to fold in the way networkx does
+    G.add_edge(0, 1)
+    G.add_edge(2, 2)
+    return nx.relabel_nodes(G, { n: f"n{n}" for n in G })
+
+
+def test_pagerank_matches_networkx():
+    G = graph()
+    values = compute_metric(CSRSnapshot.from_graph(G), "pagerank")
+    expected = nx.pagerank(G)
+    assert values == pytest.approx(expected, abs=1e-4)
+
+
+def test_core_number_matches_networkx():
+    G = graph()
+    undirected = nx.Graph(G)
+    undirected.remove_edges_from(nx.selfloop_edges(undirected))
+    values = compute_metric(CSRSnapshot.from_graph(undirected), "core")
+    assert values == nx.core_number(undirected)
+
+
+def test_communities_cover_every_node():
+    G = graph()
+    values = compute_metric(CSRSnapshot.from_graph(G), "community")
+    assert set(values) == set(G)
+
+
+def test_results_are_cached_per_version():
+    G = graph()
+    analytics = Analytics()
+    values = analytics.submit(G, 1, "pagerank").result()
+    assert analytics.cached(1, "pagerank") == values
+    assert analytics.cached(2, "pagerank") is None
+
+
+def test_metric_results_survive_undo_and_restore(tmp_path):
+    G = graph()
+    history = History(G)
+    history.journal = []
+    sessions = SessionStore(str(tmp_path))
+    sessions.save_graph("workspace1", G, history.aliases)
+
+    values = compute_metric(CSRSnapshot.from_graph(G), "pagerank")
+    with history.edit("compute pagerank") as edit:
+        edit.set_node_values("pagerank", values)
+    with history.edit("note") as edit:
+        edit.set_node_attrs("n1", {"note": "checked"})
+    sessions.save_changes("workspace1", G, history.aliases, history.journal)
+
+    restored = nx.MultiDiGraph()
+    sessions.load_graph("workspace1", restored)
+    assert dict(restored.nodes(data=True)) == dict(G.nodes(data=True))
+
+    history.undo()
+    assert G.nodes["n1"]["pagerank"] == values["n1"]
+    history.undo()
+    assert all("pagerank" not in attrs for _, attrs in G.nodes(data=True))
@@ -0,0 +1,46 @@
+import io
+import msgspec
+import networkx as nx
+import pandas as pd
+from qng import GraphFactory, NodeFactory, LinkFactory, Element, SigmaFactory, QNG, AliasIndex
+from history import encode_graph, decode_graph
+from diff import hash_graph
+from util import clean_columns, frame_columns
+
+
+# Dates and file numbers are mostly distinct, so they stay Arrow strings (not categories) and blanks stay pd.NA
+CSV = """agent,company,filed,file_number
+JOHN SMITH,ACME LLC,2019-05-01,F-1
+MARY JONES,ACME LLC,,F-2
+JOHN SMITH,BETA INC,2020-01-02,
+MARY JONES,GAMMA CO,2021-03-04,F-4
+"""
+
+
+def build() -> nx.MultiDiGraph:
+    frame = clean_columns(pd.read_csv(io.StringIO(CSV), dtype=str))
+    gf = GraphFactory(
+        node_factories = [ NodeFactory(id_field="company", type=Element(type="static", value="company"), attr=["filed", "file_number"]) ],
+        link_factories = [ LinkFactory(source_field="agent", target_field="company", type=Element(type="static", value="agent of"), attr=["filed", "file_number"]) ],
+    )
+    return gf.graph_from_columns(frame_columns(frame), "test.csv")
+
+
+def test_blank_cells_become_none():
+    G = build()
+    assert G.nodes["GAMMA CO"]["filed"] == "2021-03-04"
+    assert G.nodes["BETA INC"]["file_number"] is None
+    assert [ d["filed"] for _, _, d in G.edges("MARY JONES", data=True) ] == [None, "2021-03-04"]
+
+
+def test_graph_with_blanks_saves_and_encodes():
+    G = build()
+    qng = QNG(adjacency=nx.to_dict_of_dicts(G), node_attrs=dict(G.nodes(data=True)), sigma_factory=SigmaFactory(), hashes=hash_graph(G))
+    assert msgspec.json.decode(msgspec.json.encode(qng), type=QNG).multigraph().number_of_edges() == G.number_of_edges()
+
+    restored = nx.MultiDiGraph()
+    decode_graph(encode_graph(G, AliasIndex()), restored)
+    assert nx.utils.graphs_equal(G, restored)
+
+    html = b"".join(SigmaFactory().export_graph(G))
+    assert b"ACME LLC" in html
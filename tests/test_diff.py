@@ -0,0 +1,56 @@
+import msgspec
+import networkx as nx
+from diff import hash_graph, diff_graphs, edge_id
+from history import History
+from qng import ContentHashes
+
+
+def graphs() -> tuple[nx.MultiDiGraph, nx.MultiDiGraph]:
+    old = nx.MultiDiGraph()
+    old.add_node("JOHN SMITH", type="person", age=40)
+    old.add_node("ACME LLC", type="company")
+    old.add_node("BETA INC", type="company")
+    old.add_edge("JOHN SMITH", "ACME LLC", type="agent of")
+    old.add_edge("JOHN SMITH", "BETA INC", type="agent of")
+
+    new = nx.MultiDiGraph()
+    # the same attributes, added in another order
+    new.add_node("JOHN SMITH", age=40, type="person")
+    new.add_node("ACME LLC", type="company", status="dissolved")
+    new.add_node("1 MAIN ST", type="address")
+    new.add_edge("JOHN SMITH", "ACME LLC", type="agent of")
+    new.add_edge("JOHN SMITH", "ACME LLC", type="officer of")
+    new.add_edge("ACME LLC", "1 MAIN ST", type="located at")
+    return old, new
+
+
+def test_diff_finds_each_change():
+    old, new = graphs()
+    diff = diff_graphs(hash_graph(old), hash_graph(new))
+    assert diff.added_nodes == ["1 MAIN ST"]
+    assert diff.removed_nodes == ["BETA INC"]
+    assert diff.changed_nodes == ["ACME LLC"]
+    assert diff.added_edges == [edge_id("JOHN SMITH", "ACME LLC", 1), edge_id("ACME LLC", "1 MAIN ST", 0)]
+    assert diff.removed_edges == [edge_id("JOHN SMITH", "BETA INC", 0)]
+    assert diff.changed_edges == []
+    assert len(diff_graphs(hash_graph(new), hash_graph(new))) == 0
+
+
+def test_saved_hashes_compare_like_fresh_ones():
+    old, new = graphs()
+    saved = msgspec.json.decode(msgspec.json.encode(hash_graph(old)), type=ContentHashes)
+    assert diff_graphs(saved, hash_graph(new)) == diff_graphs(hash_graph(old), hash_graph(new))
+
+
+def test_merging_a_diff_copies_only_what_changed():
+    old, new = graphs()
+    G = old.copy()
+    history = History(G)
+    with history.edit("load graph") as edit:
+        edit.add_graph(new, diff_graphs(hash_graph(G), hash_graph(new)))
+    assert G.nodes["ACME LLC"]["status"] == "dissolved"
+    assert "1 MAIN ST" in G and "BETA INC" in G
+    assert G.number_of_edges("JOHN SMITH", "ACME LLC") == 2
+    assert G.number_of_edges() == old.number_of_edges() + 2
+    history.undo()
+    assert nx.utils.graphs_equal(G, old) and dict(G.nodes(data=True)) == dict(old.nodes(data=True))
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+from grid import FrameIndex
+from loadtest import make_frame
+
+
+def frame() -> pd.DataFrame:
+    df = make_frame(3000, seed=6).astype(object)
+    df.loc[::10, "address"] = None
+    df["filings"] = np.random.default_rng(6).integers(0, 50, len(df))
+    return df
+
+
+def test_sorting_and_filtering_match_pandas():
+    df = frame()
+    index = FrameIndex(df)
+    for column in ["agent", "address", "filings"]:
+        for descending in [False, True]:
+            expected = df.sort_values(column, ascending=not descending, kind="stable", na_position="last")
+            assert index.page(index.rows(column, descending), 0, len(df)).equals(expected)
+
+    expected = df.sort_values("company", ascending=False, kind="stable")
+    expected = expected[expected["address"].str.lower().str.contains("main", na=False)]
+    rows = index.rows("company", True, "address", "MAIN")
+    assert index.page(rows, 0, len(df)).equals(expected)
+    assert index.page(rows, 20, 10).equals(expected.iloc[20:30])
+    assert len(index.rows(filter_column="address", filter_text="nowhere")) == 0
+
+
+def test_unknown_columns_leave_rows_alone():
+    df = frame()
+    assert (FrameIndex(df).rows("missing", False, "missing", "x") == np.arange(len(df))).all()
+
+
+def test_summaries_count_blanks_and_top_values():
+    df = frame()
+    summaries = { s.column: s for s in FrameIndex(df).summarize() }
+    counts = df["address"].value_counts()
+    assert summaries["address"].distinct == df["address"].nunique()
+    assert summaries["address"].blank == df["address"].isna().mean()
+    # ties can come in either order
+    assert [ count for _, count in summaries["address"].top ] == counts.iloc[:3].tolist()
+    assert all(counts[value] == count for value, count in summaries["address"].top)
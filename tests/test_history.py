@@ -0,0 +1,84 @@
+import copy
+import networkx as nx
+from history import History
+from sessions import SessionStore, CHECKPOINT_EDITS
+from loadtest import make_frame, graph_factory
+from util import frame_columns
+
+
+def build() -> nx.MultiDiGraph:
+    return graph_factory.graph_from_columns(frame_columns(make_frame(300, seed=4)), "test.csv")
+
+
+def edit_a_lot(history:History, edits:int, offset:int = 0):
+    nodes = list(history.G)
+    for i in range(offset, offset + edits):
+        with history.edit(f"edit {i}") as edit:
+            if i % 3 == 0:
+                edit.remove_nodes(nodes[i:i + 2])
+            elif i % 3 == 1:
+                edit.combine_nodes(history.G, [ n for n in nodes[i + 10:i + 13] if n in history.G ])
+            elif nodes[i + 20] in history.G:
+                edit.set_node_attrs(nodes[i + 20], {"note": i})
+
+
+def test_undo_and_redo_give_back_each_graph():
+    G = nx.MultiDiGraph()
+    history = History(G)
+    with history.edit("build graph") as edit:
+        edit.add_graph(build())
+    states = [ copy.deepcopy(G) ]
+    nodes = list(G)
+    for i in range(6):
+        with history.edit(f"edit {i}") as edit:
+            if i % 2 == 0:
+                edit.remove_nodes(nodes[i * 3:i * 3 + 3])
+            else:
+                edit.combine_nodes(G, nodes[i * 5 + 20:i * 5 + 23])
+        states.append(copy.deepcopy(G))
+
+    for state in reversed(states[:-1]):
+        history.undo()
+        assert nx.utils.graphs_equal(G, state)
+        assert dict(G.nodes(data=True)) == dict(state.nodes(data=True))
+    for state in states[1:]:
+        history.redo()
+        assert nx.utils.graphs_equal(G, state)
+    assert history.undo_stack[0].ops[0][0] == "add_nodes"
+
+
+def test_history_size_is_bounded():
+    history = History(build(), max_size=5)
+    edit_a_lot(history, 12)
+    assert len(history.undo_stack) == 5
+
+
+def test_restore_replays_at_most_a_checkpoint_of_edits(tmp_path):
+    G = build()
+    history = History(G)
+    history.journal = []
+    sessions = SessionStore(str(tmp_path))
+    sessions.save_graph("workspace1", G, history.aliases)
+
+    # saved after every change, as the app does
+    edits = 0
+    def save():
+        nonlocal edits
+        edits += len(history.journal)
+        sessions.save_changes("workspace1", G, history.aliases, history.journal)
+        history.journal.clear()
+
+    for i in range(CHECKPOINT_EDITS + 5):
+        edit_a_lot(history, 1, offset=i)
+        save()
+    history.undo()
+    save()
+
+    assert edits > CHECKPOINT_EDITS
+    assert sessions.generation("workspace1") == 1 + edits // CHECKPOINT_EDITS
+    assert len(list(sessions.journal("workspace1"))) == edits % CHECKPOINT_EDITS
+    restored = nx.MultiDiGraph()
+    aliases = SessionStore(str(tmp_path)).load_graph("workspace1", restored)
+    assert nx.utils.graphs_equal(G, restored)
+    assert dict(G.nodes(data=True)) == dict(restored.nodes(data=True))
+    assert aliases.canonical == history.aliases.canonical
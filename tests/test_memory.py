@@ -0,0 +1,31 @@
+import copy
+import networkx as nx
+from history import History
+from memory import SessionMemory
+from test_history import build, edit_a_lot
+
+
+def test_spill_frees_the_graph_and_its_undo_steps():
+    G = build()
+    history = History(G)
+    edit_a_lot(history, 6)
+    history.undo()
+    state = copy.deepcopy(G)
+    memory = SessionMemory("session1", G, history)
+    memory.measure(graph=G)
+    dropped = []
+    memory.on_spill = lambda: dropped.append(True)
+
+    assert memory.spill() > 0
+    assert len(G) == 0 and history.undo_stack == [] and history.redo_stack == []
+    assert memory.usage.total() == 0 and dropped == [True]
+
+    memory.touch()
+    assert not memory.spilled and memory.usage.widget > 0
+    assert nx.utils.graphs_equal(G, state)
+    history.redo()
+    history.undo()
+    while history.can_undo():
+        history.undo()
+    assert nx.utils.graphs_equal(G, build())
+    assert dict(G.nodes(data=True)) == dict(build().nodes(data=True))
@@ -0,0 +1,54 @@
+import networkx as nx
+from neighborhood import Neighborhood
+
+
+def graph() -> nx.MultiDiGraph:
+    G = nx.MultiDiGraph(nx.gnm_random_graph(300, 420, seed=7, directed=True))
+    G.add_edge(0, 1)
+    G.add_edge(1, 0)
+    return G
+
+
+def within(G:nx.MultiDiGraph, sources:list, hops:int|None) -> set:
+    undirected = G.to_undirected(as_view=True)
+    found = set()
+    for s in sources:
+        found.update(nx.single_source_shortest_path_length(undirected, s, cutoff=hops))
+    return found
+
+
+def test_expand_matches_networkx():
+    G = graph()
+    for sources in [[0], [5, 17, 200]]:
+        for hops in [0, 1, 2, 4, None]:
+            assert Neighborhood(G).expand(sources, hops) == within(G, sources, hops)
+
+
+def test_more_hops_picks_up_where_the_last_search_stopped():
+    G = graph()
+    ego = Neighborhood(G)
+    for hops in [1, 2, 3]:
+        assert ego.expand([0], hops) == within(G, [0], hops)
+    assert ego.expand([0], 1) == within(G, [0], 1)
+
+
+def test_limits_cut_the_search_short():
+    G = graph()
+    ego = Neighborhood(G, max_nodes=50, max_per_hop=20)
+    found = ego.expand([0], None)
+    assert ego.search([0]).truncated
+    assert len(found) <= 50 and found <= within(G, [0], None)
+    distances = nx.single_source_shortest_path_length(G.to_undirected(as_view=True), 0)
+    # whatever was found is at its true distance
+    assert all(distances[n] == d for n, d in ego.search([0]).distances.items())
+    hops = {}
+    for d in ego.search([0]).distances.values():
+        hops[d] = hops.get(d, 0) + 1
+    assert max(hops.values()) <= 20
+
+
+def test_hubs_are_shown_but_not_searched_through():
+    G = nx.MultiDiGraph([("a", "hub"), ("hub", "b"), ("hub", "c"), ("hub", "d"), ("a", "e")])
+    ego = Neighborhood(G, max_degree=3)
+    assert ego.expand(["a"], 2) == {"a", "hub", "e"}
+    assert Neighborhood(G, max_degree=3).expand(["hub"], 1) == {"hub", "a", "b", "c", "d"}
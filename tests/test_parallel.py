@@ -0,0 +1,48 @@
+import asyncio
+import networkx as nx
+from qng import AliasIndex
+from compute import ComputePool
+from parallel import share_columns, build_range, merge_ranges, row_ranges, parallel_graph
+from loadtest import make_frame, graph_factory
+from util import frame_columns
+
+
+def same_graph(G:nx.MultiDiGraph, H:nx.MultiDiGraph) -> bool:
+    # the same nodes, links, keys and attributes, added in the same order
+    return list(G.nodes(data=True)) == list(H.nodes(data=True)) and \
+           list(G.edges(keys=True, data=True)) == list(H.edges(keys=True, data=True)) and \
+           all(list(G.pred[n]) == list(H.pred[n]) for n in G)
+
+
+def ranges_graph(frame, parts:int, aliases:AliasIndex|None = None) -> nx.MultiDiGraph:
+    shm = share_columns(frame[graph_factory.fields()])
+    try:
+        ranges = [ build_range(shm.name, start, stop, graph_factory, "test.csv", aliases) for start, stop in row_ranges(len(frame), parts) ]
+    finally:
+        shm.close()
+        shm.unlink()
+    return merge_ranges(ranges, aliases.canonical if aliases else None)
+
+
+def test_ranges_merge_to_the_serial_build():
+    frame = make_frame(3000, seed=1)
+    # blank ids make no node, and no link
+    frame.loc[::7, "address"] = None
+    G = graph_factory.graph_from_columns(frame_columns(frame), "test.csv")
+    for parts in [1, 3, 8]:
+        assert same_graph(G, ranges_graph(frame, parts))
+
+
+def test_merged_away_ids_are_skipped():
+    frame = make_frame(1000, seed=2)
+    aliases = AliasIndex.from_mapping({"JOHN SMITH": "MARY JONES", "COMPANY 5 LLC": "COMPANY 6 LLC"})
+    G = graph_factory.graph_from_columns(frame_columns(frame), "test.csv", aliases)
+    H = ranges_graph(frame, 4, aliases)
+    assert "JOHN SMITH" not in H
+    assert same_graph(G, H)
+
+
+def test_parallel_graph_inline():
+    frame = make_frame(500, seed=3)
+    G = graph_factory.graph_from_columns(frame_columns(frame), "test.csv")
+    assert same_graph(G, asyncio.run(parallel_graph(graph_factory, frame, "test.csv", ComputePool(0))))
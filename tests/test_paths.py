@@ -0,0 +1,55 @@
+import networkx as nx
+from paths import PathSearch
+
+
+def graph() -> nx.MultiDiGraph:
+    G = nx.MultiDiGraph(nx.gnm_random_graph(40, 70, seed=9, directed=True))
+    G.add_edge(0, 5)
+    G.add_edge(5, 0)
+    return G
+
+
+def run(search:PathSearch) -> list:
+    paths = []
+    while not search.done:
+        paths += search.next_batch()
+    return paths
+
+
+def simple_paths(G:nx.MultiDiGraph, source, target, cutoff:int) -> set:
+    return set(map(tuple, nx.all_simple_paths(nx.Graph(G.to_undirected()), source, target, cutoff=cutoff)))
+
+
+def test_paths_within_a_cutoff_match_networkx():
+    G = graph()
+    for target in [5, 17, 33]:
+        paths = run(PathSearch(G, 0, target, cutoff=6))
+        assert len(paths) == len(set(map(tuple, paths)))
+        assert set(map(tuple, paths)) == simple_paths(G, 0, target, 6)
+        # shortest first
+        assert [ len(p) for p in paths ] == sorted(len(p) for p in paths)
+
+
+def test_without_a_cutoff_only_the_shortest_paths():
+    G = graph()
+    search = PathSearch(G, 0, 17)
+    assert sorted(run(search)) == sorted(nx.all_shortest_paths(G.to_undirected(as_view=True), 0, 17))
+    assert search.stopped == "complete"
+
+
+def test_excluded_nodes_are_stepped_around():
+    G = nx.MultiDiGraph([("a", "hub"), ("hub", "b"), ("a", "c"), ("c", "d"), ("d", "b")])
+    assert run(PathSearch(G, "a", "b")) == [["a", "hub", "b"]]
+    assert run(PathSearch(G, "a", "b", exclude={"hub"})) == [["a", "c", "d", "b"]]
+    # unless the path starts or ends there
+    assert run(PathSearch(G, "a", "hub", exclude={"hub"})) == [["a", "hub"]]
+
+
+def test_searches_stop_at_their_limits():
+    G = graph()
+    search = PathSearch(G, 0, 33, cutoff=8, max_paths=5)
+    assert len(run(search)) == 5 and search.stopped == "max_paths"
+    search = PathSearch(G, 0, 33, cutoff=8, time_budget=1e-9)
+    assert run(search) == [] and search.stopped == "time"
+    search = PathSearch(G, 0, "missing")
+    assert run(search) == [] and search.stopped == "complete"
@@ -0,0 +1,30 @@
+import pytest
+from preview import project_graph, sample_frame
+from loadtest import make_frame, graph_factory
+from util import frame_columns
+
+
+def test_projection_is_close_to_the_full_build():
+    frame = make_frame(20000, seed=1)
+    frame.loc[::9, "address"] = None
+    projection = project_graph(frame, graph_factory, hub_threshold=20, chunk_size=3000)
+    G = graph_factory.graph_from_columns(frame_columns(frame), "test.csv")
+    assert projection.nodes == pytest.approx(len(G), rel=0.03)
+    assert projection.links == G.number_of_edges()
+    # the sketch can only overcount, so no hub is missed
+    hubs = sum(1 for _, d in G.degree() if d > 20)
+    assert hubs <= projection.hubs <= hubs * 1.01
+    for field, count in projection.ids.items():
+        assert count == pytest.approx(frame[field].nunique(), rel=0.03)
+
+
+def test_stratified_sample_keeps_rare_values():
+    frame = make_frame(5000, seed=2)
+    frame["kind"] = ["agent of", "officer of"] * 2500
+    frame.loc[:2, "kind"] = "director of"
+    sample = sample_frame(frame, 500, stratify="kind")
+    assert set(sample["kind"]) == {"agent of", "officer of", "director of"}
+    assert len(sample) == pytest.approx(500, rel=0.3)
+    assert set(sample.index) <= set(frame.index)
+    assert len(sample_frame(frame, 500)) == 500
+    assert sample_frame(frame, 10000) is frame
@@ -0,0 +1,49 @@
+import networkx as nx
+from history import History, replay
+from qng import AliasIndex
+from snapshot import write_snapshot, open_snapshot, attach, is_attached
+from test_history import build, edit_a_lot
+
+
+def same(G:nx.MultiDiGraph, H:nx.MultiDiGraph) -> bool:
+    return dict(G.nodes(data=True)) == dict(H.nodes(data=True)) and \
+           sorted(map(repr, G.edges(keys=True, data=True))) == sorted(map(repr, H.edges(keys=True, data=True))) and \
+           sorted(map(repr, G.in_edges(keys=True))) == sorted(map(repr, H.in_edges(keys=True)))
+
+
+def test_overlay_edits_match_a_private_copy(tmp_path):
+    base = build()
+    path = str(tmp_path / "base.qngsnap")
+    write_snapshot(base, path)
+
+    G = nx.MultiDiGraph()
+    history = History(G)
+    history.journal = []
+    with history.edit("load graph") as edit:
+        edit.attach(open_snapshot(path))
+    other = nx.MultiDiGraph()
+    attach(other, open_snapshot(path))
+
+    copy = build()
+    states = [ build() ]
+    for i in range(8):
+        edit_a_lot(history, 1, offset=i)
+        edit_a_lot(History(copy), 1, offset=i)
+        assert same(G, copy)
+        states.append(copy.copy())
+    # a second graph on the same snapshot doesn't see the first one's changes
+    assert same(other, base)
+
+    for state in reversed(states[:-1]):
+        history.undo()
+        assert same(G, state)
+    history.undo()
+    assert len(G) == 0 and not is_attached(G)
+    for state in states:
+        history.redo()
+        assert same(G, state)
+
+    restored = nx.MultiDiGraph()
+    for data in history.journal:
+        replay(data, restored, AliasIndex())
+    assert same(restored, G)
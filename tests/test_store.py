@@ -0,0 +1,61 @@
+import io
+import networkx as nx
+import pandas as pd
+from qng import GraphFactory, NodeFactory, LinkFactory, Element
+from store import GraphStore, StoreNeighborhood
+from neighborhood import Neighborhood
+from util import clean_columns, frame_columns, iter_columns
+
+
+CSV = """agent,company,filed
+JOHN SMITH,ACME LLC,2019-05-01
+MARY JONES,ACME LLC,
+JOHN SMITH,BETA INC,2020-01-02
+MARY JONES,GAMMA CO,2021-03-04
+PAT LEE,GAMMA CO,2021-03-04
+"""
+
+gf = GraphFactory(
+    node_factories = [ NodeFactory(id_field="company", type=Element(type="static", value="company"), attr=["filed"]) ],
+    link_factories = [ LinkFactory(source_field="agent", target_field="company", type=Element(type="static", value="agent of")) ],
+)
+
+
+def frame() -> pd.DataFrame:
+    return clean_columns(pd.read_csv(io.StringIO(CSV), dtype=str))
+
+
+def stored(store:GraphStore) -> nx.MultiDiGraph:
+    ids = [ r[0] for r in store.db.execute("SELECT id FROM nodes UNION SELECT source FROM edges UNION SELECT target FROM edges") ]
+    return store.subgraph(ids)
+
+
+def test_building_twice_adds_nothing():
+    store = GraphStore()
+    gf.store_graphs(iter_columns(frame(), chunk_size=2), "test.csv", store)
+    once = stored(store)
+    gf.store_graphs(iter_columns(frame(), chunk_size=2), "test.csv", store)
+    twice = stored(store)
+    assert twice.number_of_edges() == once.number_of_edges() == 5
+    assert len(twice) == len(once)
+
+
+def test_nodes_match_an_in_memory_build():
+    store = GraphStore()
+    gf.store_graphs(iter_columns(frame(), chunk_size=2), "test.csv", store)
+    G = gf.graph_from_columns(frame_columns(frame()), "test.csv")
+    H = stored(store)
+    assert dict(H.nodes(data=True)) == dict(G.nodes(data=True))
+    # ACME LLC is seen twice, the second time with no date, and keeps its keys either way
+    assert "filed" in H.nodes["ACME LLC"]
+
+
+def test_store_neighborhood_matches_networkx():
+    store = GraphStore()
+    gf.store_graphs(iter_columns(frame()), "test.csv", store)
+    G = gf.graph_from_columns(frame_columns(frame()), "test.csv")
+    for hops in [1, 2, 3, None]:
+        assert StoreNeighborhood(store).expand(["JOHN SMITH"], hops) == Neighborhood(G).expand(["JOHN SMITH"], hops)
+    # endpoints without a node row are still found
+    assert "PAT LEE" in store
+    assert StoreNeighborhood(store, max_nodes=3).expand(["JOHN SMITH"], None) <= Neighborhood(G).expand(["JOHN SMITH"], None)
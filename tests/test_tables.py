@@ -0,0 +1,26 @@
+import networkx as nx
+import pytest
+from tables import export_tables, import_tables
+
+
+def graph(ids) -> nx.MultiDiGraph:
+    G = nx.MultiDiGraph()
+    a, b, c = ids
+    G.add_node(a, label="JOHN SMITH", type="person", data_source="test.csv", age=40)
+    G.add_node(b, label="ACME LLC", type="company", data_source="test.csv")
+    G.add_node(c, label="1 MAIN ST", type="address", data_source="test.csv", note=None)
+    G.add_edge(a, b, type="agent of", since="2019")
+    G.add_edge(a, b, type="agent of", since="2021")
+    G.add_edge(b, c, type="located at")
+    return G
+
+
+@pytest.mark.parametrize("format", ["parquet", "arrow"])
+@pytest.mark.parametrize("ids", [[1, 2, 30], ["JOHN SMITH", "ACME LLC", "1 MAIN ST"], ["1", "2", "x"]])
+def test_tables_round_trip(tmp_path, format, ids):
+    G = graph(ids)
+    path = tmp_path / "tables.zip"
+    path.write_bytes(b"".join(export_tables(G, format, batch_size=2)))
+    H = import_tables(str(path))
+    assert list(H.nodes(data=True)) == list(G.nodes(data=True))
+    assert list(H.edges(keys=True, data=True)) == list(G.edges(keys=True, data=True))
@@ -0,0 +1,59 @@
+import random
+import networkx as nx
+from datetime import date, timedelta
+from temporal import TemporalIndex
+
+
+def graph(seed:int = 3) -> nx.MultiDiGraph:
+    rng = random.Random(seed)
+    G = nx.MultiDiGraph()
+    for i in range(400):
+        start = date(2015, 1, 1) + timedelta(days=rng.randrange(3000))
+        end = start + timedelta(days=rng.randrange(800))
+        attrs = {"start": start.isoformat(), "end": end.isoformat()}
+        # some links have no start, no end, or a date that isn't one
+        if i % 11 == 0:
+            attrs["start"] = None
+        if i % 13 == 0:
+            del attrs["end"]
+        if i % 17 == 0:
+            attrs["start"] = "unknown"
+        G.add_edge(rng.randrange(100), rng.randrange(100), **attrs)
+    return G
+
+
+def active(G:nx.MultiDiGraph, first:date, last:date) -> set:
+    def day(value, missing):
+        try:
+            return date.fromisoformat(value) if value else missing
+        except ValueError:
+            return missing
+    return { (u, v, k) for u, v, k, d in G.edges(keys=True, data=True)
+             if day(d.get("start"), date.min) <= last and day(d.get("end"), date.max) >= first }
+
+
+def test_sliding_window_matches_a_full_scan():
+    G = graph()
+    index = TemporalIndex(G, "start", "end")
+    rng = random.Random(4)
+    # forwards, backwards, wider and narrower, as a slider is dragged
+    for _ in range(60):
+        first = date(2014, 1, 1) + timedelta(days=rng.randrange(4500))
+        last = first + timedelta(days=rng.randrange(400))
+        assert set(index.subgraph(first, last).edges(keys=True)) == active(G, first, last)
+
+
+def test_date_range_skips_missing_dates():
+    G = nx.MultiDiGraph()
+    G.add_edge("a", "b", start="2019-05-01", end=None)
+    G.add_edge("b", "c", start=None, end="2021-03-04")
+    G.add_edge("c", "d", start="", end="")
+    assert TemporalIndex(G, "start", "end").date_range() == (date(2019, 5, 1), date(2021, 3, 4))
+    assert TemporalIndex(G, "missing").date_range() is None
+
+
+def test_without_an_end_links_last_forever():
+    G = graph()
+    index = TemporalIndex(G, "start")
+    found = set(index.subgraph(date(2030, 1, 1)).edges(keys=True))
+    assert found == { (u, v, k) for u, v, k in G.edges(keys=True) }
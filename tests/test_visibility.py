@@ -0,0 +1,40 @@
+import networkx as nx
+from visibility import VisibilityIndex
+
+
+def graph() -> nx.MultiDiGraph:
+    G = nx.MultiDiGraph()
+    G.add_node("JOHN SMITH", type="person")
+    G.add_node("ACME LLC", type="company")
+    G.add_node("1 MAIN ST", type="address")
+    G.add_edge("JOHN SMITH", "ACME LLC", type="agent of")
+    G.add_edge("ACME LLC", "1 MAIN ST", type="located at")
+    return G
+
+
+def test_hidden_categories_stay_hidden_after_an_edit():
+    G = graph()
+    hidden_nodes, hidden_links = {"type": {"person"}}, {"type": {"located at"}}
+    assert set(VisibilityIndex(G).subgraph(hidden_nodes, hidden_links).edges(keys=True)) == set()
+
+    G.add_node("MARY JONES", type="person")
+    G.add_edge("MARY JONES", "1 MAIN ST", type="lives at")
+    # the app builds a new index for each graph version
+    visible = VisibilityIndex(G).subgraph(hidden_nodes, hidden_links)
+    assert set(visible) == {"ACME LLC", "1 MAIN ST"}
+    assert visible.number_of_edges() == 0
+
+
+def test_links_need_both_ends_visible():
+    index = VisibilityIndex(graph())
+    visible = index.subgraph({"type": {"address"}}, {"type": set()})
+    assert list(visible.edges()) == [("JOHN SMITH", "ACME LLC")]
+    assert index.subgraph({"type": set()}, {"type": set()}) is index.G
+
+
+def test_visible_tells_when_a_toggle_changes_nothing():
+    index = VisibilityIndex(graph())
+    hiding_address = index.visible({"type": {"address"}}, {"type": set()})
+    # the only located at link already ends at a hidden address
+    assert index.visible({"type": {"address"}}, {"type": {"located at"}}) == hiding_address
+    assert index.visible({"type": set()}, {"type": set()}) != hiding_address
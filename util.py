@@ -4,6 +4,7 @@ import pandas as pd
 import usaddress 
 import probablepeople as pp 
 import msgspec
+from qng import null_mask
 
 # import requests 
 # import msgspec 
@@ -77,7 +78,7 @@ def combine_nodes(G, nodes:list):
     return G 
 
 
-def tidy_up(G, ignore_middle_initial = True):
+def find_duplicates(G, ignore_middle_initial = True) -> list:
     nf = extract_name_parts(G)
     name_grouping = ['GivenName', 'Surname', 'SuffixGenerational'] if ignore_middle_initial else ['GivenName', 'MiddleInitial', 'Surname', 'SuffixGenerational']
     
@@ -86,12 +87,24 @@ def tidy_up(G, ignore_middle_initial = True):
         
     nd = get_probable_duplicates(nf, name_grouping) if len(nf) > 0 else []
     sd = get_probable_duplicates(sr, street_grouping) if len(sr) > 0 else []
-    duplicates = nd + sd
+    return nd + sd
+
+
+def tidy_up(G, ignore_middle_initial = True, combine = combine_nodes, duplicates = None):
+    if duplicates is None:
+        duplicates = find_duplicates(G, ignore_middle_initial)
     for d in duplicates:
-        G = combine_nodes(G, d)
+        G = combine(G, d)
     return G     
 
 
+# Just the nodes find_duplicates looks at, small enough to send to another process
+def tidy_graph(G) -> nx.MultiDiGraph:
+    H = nx.MultiDiGraph()
+    H.add_nodes_from( (n, {"label": d.get("label"), "tidy": d["tidy"]}) for n, d in G.nodes(data=True) if d.get("tidy") in ["name", "address"] )
+    return H
+
+
 def get_probable_duplicates(df, grouping):
     grouping = [g for g in grouping if g in df.columns]
     probable_duplicates = (
@@ -119,7 +132,43 @@ def clean_columns(df:pd.DataFrame)->pd.DataFrame:
         c: c.lower().strip().replace(' ', '_') 
         for c in df.columns }
     df = df.rename(columns=lowercase)
-    return df.astype('str')
+    return df.apply(compact_column)
+
+
+# Text stored in Arrow buffers instead of one Python object per cell, and 
+# dictionary encoded (categorical) when values repeat enough for it to pay off
+def compact_column(column:pd.Series, max_unique_ratio:float = 0.5) -> pd.Series:
+    column = column.astype("string[pyarrow]")
+    if column.nunique(dropna=True) <= max_unique_ratio * len(column):
+        column = column.astype("category")
+    return column
+
+
+def frame_columns(df:pd.DataFrame) -> dict:
+    return { c: df[c] for c in df.columns }
+
+
+def iter_columns(df:pd.DataFrame, chunk_size:int = 10000):
+    for i in range(0, len(df), chunk_size):
+        yield frame_columns(df.iloc[i:i + chunk_size])
+
+
+def null_counts(df:pd.DataFrame, columns:list) -> dict:
+    return { c: sum(null_mask(df[c].tolist())) for c in columns if c in df.columns }
+
+
+# Rows the graph builder skips because a column it links on is blank
+def null_rows(df:pd.DataFrame, columns:list) -> pd.DataFrame:
+    columns = [ c for c in columns if c in df.columns ]
+    if len(columns) == 0:
+        return df.iloc[0:0]
+    blank = pd.DataFrame({ c: null_mask(df[c].tolist()) for c in columns }, index=df.index).any(axis=1)
+    return df[blank]
+
+
+def get_hubs(G:nx.MultiGraph, threshold:int) -> list:
+    hubs = [ (n, d) for n, d in G.degree() if d > threshold ]
+    return sorted(hubs, key=lambda h: h[1], reverse=True)
 
 
 def get_edges(df, source, target, type):
@@ -151,14 +200,6 @@ def get_node_keys(G:nx.MultiGraph):
     return list(node_keys)
 
 
-def get_path_graph(G, node_1, node_2):
-    path_nodes = set()
-    shortest_paths = list(nx.all_shortest_paths(G.to_undirected(as_view=True), node_1, node_2))
-    for path in shortest_paths:
-        path_nodes.update(path)
-    return nx.induced_subgraph(G, list(path_nodes))
-  
-  
 def get_connected_nodes(G, node, nbrhood:dict = {}) -> dict:
     graph = G.to_undirected(as_view=True)
     if node in graph:
@@ -0,0 +1,70 @@
+import numpy as np
+import networkx as nx
+from itertools import compress
+
+
+NODE_CATEGORIES = {"type": "Node types", "data_source": "Sources", "tidy": "Cleaned as"}
+LINK_CATEGORIES = {"type": "Link types"}
+
+# Attributes with more values than this are ids or details, not categories
+MAX_VALUES = 200
+
+
+def category(value) -> str:
+    return "(none)" if value is None else str(value)
+
+
+# One boolean array per value, lined up with the graph's nodes (or links)
+def category_masks(values:list) -> dict[str, np.ndarray]:
+    lookup = {}
+    codes = np.array([ lookup.setdefault(category(v), len(lookup)) for v in values ], dtype=np.int64)
+    if len(lookup) > MAX_VALUES:
+        return {}
+    return { value: codes == code for value, code in lookup.items() }
+
+
+# Hides categories of nodes and links without touching the graph. Masks for every category value
+# are worked out once per graph version, so a toggle is a few array operations and one lazy view.
+class VisibilityIndex:
+
+    def __init__(self, G:nx.MultiDiGraph):
+        self.G = G
+        self.nodes = list(G)
+        self.edges = list(G.edges(keys=True))
+        position = { n: i for i, n in enumerate(self.nodes) }
+        self.sources = np.array([ position[u] for u, _, _ in self.edges ], dtype=np.int64)
+        self.targets = np.array([ position[v] for _, v, _ in self.edges ], dtype=np.int64)
+        self.node_masks = { attr: category_masks([ d for _, d in G.nodes(data=attr) ]) for attr in NODE_CATEGORIES }
+        self.link_masks = { attr: category_masks([ d for _, _, d in G.edges(data=attr) ]) for attr in LINK_CATEGORIES }
+
+    def values(self, attr:str, links:bool = False) -> list[str]:
+        return sorted((self.link_masks if links else self.node_masks).get(attr, {}))
+
+    def hidden_mask(self, masks:dict, hidden:dict, length:int) -> np.ndarray:
+        mask = np.zeros(length, dtype=bool)
+        for attr, values in hidden.items():
+            for value in values:
+                if value in masks.get(attr, {}):
+                    mask |= masks[attr][value]
+        return mask
+
+    def masks(self, hidden_nodes:dict, hidden_links:dict) -> tuple[np.ndarray, np.ndarray]:
+        visible_nodes = ~self.hidden_mask(self.node_masks, hidden_nodes, len(self.nodes))
+        # a link shows only if it and both its ends do
+        visible_links = visible_nodes[self.sources] & visible_nodes[self.targets] & ~self.hidden_mask(self.link_masks, hidden_links, len(self.edges))
+        return visible_nodes, visible_links
+
+    # Which nodes and links show, packed to compare cheaply with what's on screen
+    def visible(self, hidden_nodes:dict, hidden_links:dict) -> bytes:
+        visible_nodes, visible_links = self.masks(hidden_nodes, hidden_links)
+        return np.packbits(visible_nodes).tobytes() + np.packbits(visible_links).tobytes()
+
+    def subgraph(self, hidden_nodes:dict, hidden_links:dict) -> nx.MultiDiGraph:
+        if not any(hidden_nodes.values()) and not any(hidden_links.values()):
+            return self.G
+        visible_nodes, visible_links = self.masks(hidden_nodes, hidden_links)
+        nodes = set(compress(self.nodes, visible_nodes))
+        if not any(hidden_links.values()):
+            return nx.subgraph_view(self.G, filter_node=nodes.__contains__)
+        links = set(compress(self.edges, visible_links))
+        return nx.subgraph_view(self.G, filter_node=nodes.__contains__, filter_edge=lambda u, v, k: (u, v, k) in links)